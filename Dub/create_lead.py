@@ -1,10 +1,9 @@
-from pydub.generators import Sine
+from oscillators import create_wave
 
 def create_lead(frequency, duration_ms):
     """Create a lead sound."""
-    sine_wave = Sine(frequency)
     # Amplifying the sine wave to get a stronger, more pronounced sound for the lead
-    sine_audio = sine_wave.to_audio_segment(duration=duration_ms).apply_gain(3)
+    sine_audio = create_wave("sine", frequency, duration_ms, volume=3)
     return sine_audio
 
 def create_lead_wave_table(base_frequency=261.63, duration_ms=1000):
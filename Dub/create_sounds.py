@@ -1,26 +1,26 @@
 import os
 from pydub import AudioSegment
-from pydub.generators import Sawtooth, Sine, WhiteNoise
 from pydub.playback import play
 
+from noise import create_noise
+from oscillators import create_wave
+
 # Determine the full path for the temporary WAV file
 temp_wav_path = os.path.join(os.path.expanduser("~"), "Downloads", "temp_sound.wav")
 
-def create_white_noise(duration_ms):
-    """Create a white noise audio segment."""
-    noise = WhiteNoise().to_audio_segment(duration=duration_ms)
+def create_white_noise(duration_ms, seed=3):
+    """Create a white noise audio segment, the same for the same seed."""
+    noise = create_noise("white", duration_ms, seed)
     return noise
 
 def create_sawtooth_wave(frequency, duration_ms):
     """Create a sawtooth wave audio segment."""
-    sawtooth_wave = Sawtooth(frequency)
-    sawtooth_audio = sawtooth_wave.to_audio_segment(duration=duration_ms)
+    sawtooth_audio = create_wave("saw", frequency, duration_ms)
     return sawtooth_audio
 
 def create_sine_wave(frequency, duration_ms):
     """Create a sine wave audio segment."""
-    sine_wave = Sine(frequency)
-    sine_audio = sine_wave.to_audio_segment(duration=duration_ms)
+    sine_audio = create_wave("sine", frequency, duration_ms)
     return sine_audio
 
 # Duration of each sound in milliseconds
@@ -0,0 +1,106 @@
+import numpy as np
+
+# Feedback delay
+# --------------
+#
+# A delay line with feedback, run on numpy arrays of one sound or a whole
+# table of notes (one per row). The line's output is its input D samples ago
+# plus `feedback` times its own output D samples ago, so any block of D
+# samples only depends on the block before it. The line is filled a block of
+# D samples at a time, every row at once, which is exact and needs a Python
+# step per delay time rather than per sample: a 100 ms delay over a 250 ms
+# note is three array operations.
+
+# Note lengths in beats; "d" makes a note dotted, "t" a triplet
+DIVISIONS = {
+    "1/1": 4.0,
+    "1/2": 2.0,
+    "1/4": 1.0,
+    "1/8": 0.5,
+    "1/16": 0.25,
+    "1/32": 0.125,
+}
+
+
+def tempo_delay_ms(bpm, division="1/8"):
+    """
+    Delay time of a note length at a tempo.
+
+    Parameters:
+    - bpm: Tempo in beats per minute.
+    - division: Note length, e.g. "1/8", "1/8d" (dotted) or "1/16t" (triplet).
+
+    Returns:
+    - Delay time in milliseconds.
+    """
+    beats = DIVISIONS[division.rstrip("dt")]
+    if division.endswith("d"):
+        beats *= 1.5
+    elif division.endswith("t"):
+        beats *= 2.0 / 3.0
+    return beats * 60000.0 / bpm
+
+
+def delay_line(samples, delay_samples, feedback=0.0):
+    """
+    Output of a feedback delay line, the length of the input.
+
+    Parameters:
+    - samples: Float numpy array, 1-D or one sound per row.
+    - delay_samples: Delay time in samples, at least 1.
+    - feedback: How much of the line's output goes back into it; below 1
+                for the repeats to die away.
+
+    Returns:
+    - float32 numpy array shaped like samples: only the repeats, no dry signal.
+    """
+    delay_samples = max(int(delay_samples), 1)
+    length = samples.shape[-1]
+    wet = np.zeros(samples.shape, dtype=np.float32)
+
+    for start in range(delay_samples, length, delay_samples):
+        end = min(start + delay_samples, length)
+        block = wet[..., start:end]
+        # What went into the line one delay time ago: the input plus the fed back output
+        block += samples[..., start - delay_samples:end - delay_samples]
+        if feedback:
+            block += np.float32(feedback) * wet[..., start - delay_samples:end - delay_samples]
+
+    return wet
+
+
+def feedback_delay(samples, delay_ms, feedback=0.0, mix=0.5, sample_rate=44100):
+    """
+    Feedback delay effect.
+
+    The repeats stop at the end of each sound, which keeps its length, like
+    overlaying an echo on an AudioSegment does.
+
+    Parameters:
+    - samples: Float numpy array, 1-D or one sound per row (e.g. a note table).
+    - delay_ms: Delay time in milliseconds, e.g. from tempo_delay_ms().
+    - feedback: How much of every repeat comes back in the next one, 0 for a single repeat.
+    - mix: Share of the repeats in the output: 0 is dry, 1 is only the repeats.
+    - sample_rate: Sample rate in Hz.
+
+    Returns:
+    - New float32 numpy array shaped like samples.
+    """
+    delay_samples = max(int(round(delay_ms * sample_rate / 1000.0)), 1)
+    length = samples.shape[-1]
+
+    # Start from the dry signal and add the repeats onto it a block at a
+    # time, already at the wet level, keeping only the last block of them
+    # for the feedback rather than a whole wet copy of the input
+    output = np.multiply(samples, np.float32(1.0 - mix), dtype=np.float32)
+    repeat = None
+
+    for start in range(delay_samples, length, delay_samples):
+        end = min(start + delay_samples, length)
+        block = np.multiply(samples[..., start - delay_samples:end - delay_samples], np.float32(mix), dtype=np.float32)
+        if feedback and repeat is not None:
+            block += np.float32(feedback) * repeat[..., :end - start]
+        output[..., start:end] += block
+        repeat = block
+
+    return output
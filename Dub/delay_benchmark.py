@@ -0,0 +1,48 @@
+import math
+import timeit
+
+import numpy as np
+
+from delay import feedback_delay
+from mixer import mix_samples, segment_to_array
+from oscillators import create_wave
+from wavetable import normalize
+
+# Compare the batched feedback delay against the old resampling echo
+# ------------------------------------------------------------------
+
+
+def simple_delay(audio, delay_time, decay_factor):
+    """The old echo from song5.py: a copy spawned at twice the frame rate, 20dB down, overlaid."""
+    delayed = audio._spawn(audio.raw_data, overrides={
+       "frame_rate": audio.frame_rate
+    }).set_frame_rate(audio.frame_rate * 2)
+
+    delayed = delayed - 20  # reduce volume of delayed segment
+    combined = audio.overlay(delayed, position=delay_time)
+
+    return combined.apply_gain(10 * math.log10(decay_factor))
+
+
+def echo_loop(notes):
+    """The old bass echo, one note at a time, back at the mixer's sample rate."""
+    return [mix_samples(note.overlay(simple_delay(note, 100, 0.5)).normalize(), 44100) for note in notes]
+
+
+def echo_batched(table):
+    """The same echo as song5.py makes it now, every note in one call."""
+    echoed = feedback_delay(table, 100, feedback=0.0, mix=0.04)
+    echoed *= np.float32(10 ** (5 / 20))
+    np.clip(echoed, -32768, 32767, out=echoed)
+    return normalize(echoed.astype(np.int16))
+
+
+for count in [2, 12, 48]:
+    notes = [create_wave("saw", 65.41 * 2 ** (i / 12), 250).normalize() for i in range(count)]
+    table = np.stack([segment_to_array(note) for note in notes])
+
+    # Best of a few runs, to keep other load on the machine out of it
+    runs = 5
+    old = min(timeit.repeat(lambda: echo_loop(notes), number=runs, repeat=3)) / runs
+    new = min(timeit.repeat(lambda: echo_batched(table), number=runs, repeat=3)) / runs
+    print(f"{count:3d} notes: simple_delay {old * 1000:7.2f} ms, feedback_delay {new * 1000:6.3f} ms, {old / new:5.0f}x faster")
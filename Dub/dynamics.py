@@ -0,0 +1,255 @@
+import numpy as np
+from pydub.utils import db_to_float
+
+# Dynamics
+# --------
+#
+# A soft-clip waveshaper for distortion, a lookahead brickwall limiter for
+# the master bus, and sidechain ducking. All work on float samples at the
+# mixer's 16-bit scale.
+#
+# The limiter runs on a stream of blocks and keeps its state between them, so
+# a whole song goes through it once, a chunk at a time, instead of every note
+# and section being normalized on its own. Its gain is worked out for a whole
+# block at once: the gain each sample needs, held over the lookahead with a
+# running minimum, a constant-rate release (a running minimum as well, once
+# the ramp is taken out), and a moving average over the lookahead, which turns
+# the drops into smooth ramps that are finished by the time the peak plays.
+
+# Full scale at the mixer's 16-bit scale
+FULL_SCALE = 32767.0
+
+
+def soft_clip(samples, drive=0.0, shape="tanh", ceiling=FULL_SCALE):
+    """
+    Soft-clip waveshaper, in place.
+
+    Parameters:
+    - samples: Writable float numpy array at 16-bit scale, any shape.
+    - drive: Gain in dB before the shaper; more drive, more distortion.
+    - shape: "tanh", or "cubic" for the gentler 1.5x - 0.5x^3 curve, which is
+             flat (clipped) past full scale.
+    - ceiling: Level the shaper saturates at.
+
+    Returns:
+    - samples.
+    """
+    samples *= np.float32(db_to_float(drive) / ceiling)
+    if shape == "cubic":
+        np.clip(samples, -1.0, 1.0, out=samples)
+        samples *= np.float32(1.5) - np.float32(0.5) * samples * samples
+    else:
+        np.tanh(samples, out=samples)
+    samples *= np.float32(ceiling)
+    return samples
+
+
+def _running_min(values, window):
+    # Minimum of every run of `window` consecutive values (van Herk/Gil-Werman):
+    # prefix and suffix minimums within fixed blocks cover any window in two lookups
+    count = len(values) - window + 1
+    blocks = -(-len(values) // window)
+    padded = np.full(blocks * window, np.inf)
+    padded[:len(values)] = values
+
+    rows = padded.reshape(blocks, window)
+    prefix = np.minimum.accumulate(rows, axis=1).ravel()
+    suffix = np.minimum.accumulate(rows[:, ::-1], axis=1)[:, ::-1].ravel()
+    return np.minimum(suffix[:count], prefix[window - 1:window - 1 + count])
+
+
+class Limiter:
+    """
+    Lookahead brickwall limiter for a stream of blocks.
+
+    No output sample goes over the ceiling. The output runs `lookahead`
+    samples behind the input; stream() takes that delay back out.
+
+    Parameters:
+    - ceiling_db: Highest output level in dB below full scale.
+    - lookahead_ms: How far ahead the limiter sees peaks coming, which is
+                    also how long it takes to turn the gain down.
+    - release_ms: Time the gain takes to come back from 20dB of reduction (it
+                  comes back at a constant rate in dB).
+    - sample_rate: Sample rate in Hz.
+    """
+
+    def __init__(self, ceiling_db=-0.3, lookahead_ms=5.0, release_ms=200.0, sample_rate=44100):
+        self.ceiling = FULL_SCALE * db_to_float(ceiling_db)
+        self.lookahead = max(int(round(lookahead_ms * sample_rate / 1000.0)), 1)
+        self.release = 20.0 / max(release_ms * sample_rate / 1000.0, 1.0)  # dB per sample
+
+        # The last `lookahead` input samples and gains needed, the released
+        # gains still inside the moving average, and the last released gain
+        self._delay = np.zeros(self.lookahead, dtype=np.float32)
+        self._needed = np.zeros(self.lookahead)
+        self._averaged = np.zeros(self.lookahead - 1)
+        self._gain = 0.0
+
+    def __call__(self, block):
+        """
+        Limit the next block of the stream.
+
+        Parameters:
+        - block: 1-D float numpy array at 16-bit scale.
+
+        Returns:
+        - float32 numpy array as long as block, `lookahead` samples behind it.
+        """
+        block = np.asarray(block, dtype=np.float32)
+        if not len(block):
+            return block
+
+        # Gain each new sample needs to stay under the ceiling, in dB
+        peaks = np.abs(block).astype(np.float64)
+        needed = np.zeros(len(block))
+        loud = peaks > self.ceiling
+        needed[loud] = 20 * np.log10(self.ceiling / peaks[loud])
+
+        # Hold every drop for the lookahead, so it covers the sample going out now
+        held = _running_min(np.concatenate((self._needed, needed)), self.lookahead + 1)
+
+        # Come back up at the release rate: g[n] = min(held[k] + (n - k) * rate) over k <= n
+        ramp = np.arange(len(block)) * self.release
+        released = np.minimum(np.minimum.accumulate(held - ramp), self._gain + self.release) + ramp
+
+        # Average over the lookahead to turn the steps into ramps; every gain in
+        # the window is already low enough for the sample going out, so their mean is too
+        window = np.concatenate((self._averaged, released))
+        total = np.cumsum(np.concatenate(([0.0], window)))
+        gain_db = (total[self.lookahead:] - total[:-self.lookahead]) / self.lookahead
+
+        delayed = np.concatenate((self._delay, block))
+        out = delayed[:len(block)] * (10 ** (gain_db / 20)).astype(np.float32)
+
+        self._delay = delayed[len(block):]
+        self._needed = np.concatenate((self._needed, needed))[-self.lookahead:]
+        self._averaged = window[len(window) - (self.lookahead - 1):]
+        self._gain = released[-1]
+        return out
+
+    def flush(self):
+        """Push the last `lookahead` samples out of the limiter, returning them."""
+        return self(np.zeros(self.lookahead, dtype=np.float32))
+
+    def stream(self, blocks):
+        """
+        Limit a stream of blocks with the delay taken back out.
+
+        Parameters:
+        - blocks: Iterable of 1-D float numpy arrays.
+
+        Yields:
+        - float32 numpy arrays, together exactly as long as the input and in
+          time with it.
+        """
+        skip = self.lookahead
+        for block in blocks:
+            out = self(block)
+            if skip:
+                dropped = min(skip, len(out))
+                out, skip = out[dropped:], skip - dropped
+            if len(out):
+                yield out
+
+        tail = self.flush()
+        yield tail[skip:]
+
+
+def duck(onsets, length, depth_db=6.0, attack_ms=1.0, hold_ms=20.0, release_ms=150.0, sample_rate=44100):
+    """
+    Sidechain gain keyed from note onsets, e.g. the kick's events.
+
+    Every hit pulls the gain down by depth_db over the attack, holds it, and
+    lets it back up at a constant rate in dB. The envelope is worked out for
+    the whole buffer at once from the time since the last two hits: a hit's
+    reduction only falls after its attack, so an older hit can't be deeper
+    than the one after it as long as hits are at least attack_ms apart.
+
+    Parameters:
+    - onsets: Sample offsets of the hits.
+    - length: Length of the envelope in samples.
+    - depth_db: Gain reduction of a hit in dB.
+    - attack_ms: Time to reach the full reduction.
+    - hold_ms: Time the full reduction is held.
+    - release_ms: Time to come back from the full reduction.
+    - sample_rate: Sample rate in Hz.
+
+    Returns:
+    - float32 numpy array of linear gains, to multiply the ducked tracks by.
+    """
+    def frames(ms):
+        return int(round(ms * sample_rate / 1000.0))
+
+    # One hit's reduction in dB, and 0 for every sample after it
+    shape = np.concatenate((np.linspace(0.0, depth_db, frames(attack_ms), endpoint=False),
+                            np.full(frames(hold_ms), float(depth_db)),
+                            np.linspace(depth_db, 0.0, frames(release_ms) + 1)))
+
+    onsets = np.unique(np.asarray(onsets, dtype=np.int64))
+    onsets = onsets[(onsets >= 0) & (onsets < length)]
+    reduction = np.zeros(length)
+
+    if len(onsets):
+        position = np.arange(length)
+        latest = np.searchsorted(onsets, position, side="right") - 1
+        for hit in (latest, latest - 1):
+            since = np.clip(position - onsets[np.maximum(hit, 0)], 0, len(shape) - 1)
+            np.maximum(reduction, np.where(hit >= 0, shape[since], 0.0), out=reduction)
+
+    return (10 ** (-reduction / 20)).astype(np.float32)
+
+
+def duck_stem(stem, threshold_db=-20.0, ratio=4.0, attack_ms=1.0, release_ms=150.0, sample_rate=44100):
+    """
+    Sidechain gain keyed from a rendered stem, e.g. the kick's.
+
+    A compressor's gain computer run on the whole stem at once: the reduction
+    every sample's level calls for, let back up at a constant rate in dB (a
+    running maximum once the ramp is taken out, as in the Limiter) and
+    averaged over the attack.
+
+    Parameters:
+    - stem: 1-D float numpy array at 16-bit scale.
+    - threshold_db: Level above which the key ducks the tracks, in dB below full scale.
+    - ratio: Compression ratio; the reduction is (level - threshold) * (1 - 1 / ratio).
+    - attack_ms: Time to reach the full reduction.
+    - release_ms: Time the gain takes to come back from 20dB of reduction.
+    - sample_rate: Sample rate in Hz.
+
+    Returns:
+    - float32 numpy array of linear gains as long as stem.
+    """
+    peaks = np.abs(np.asarray(stem, dtype=np.float64))
+    threshold = FULL_SCALE * db_to_float(threshold_db)
+    needed = np.zeros(len(peaks))
+    loud = peaks > threshold
+    needed[loud] = 20 * np.log10(peaks[loud] / threshold) * (1 - 1 / ratio)
+
+    # Release: r[n] = max(needed[k] - (n - k) * rate) over k <= n
+    rate = 20.0 / max(release_ms * sample_rate / 1000.0, 1.0)
+    ramp = np.arange(len(peaks)) * rate
+    released = np.maximum.accumulate(needed + ramp) - ramp
+
+    # Attack: a moving average, so the reduction comes in over attack_ms
+    attack = max(int(round(attack_ms * sample_rate / 1000.0)), 1)
+    total = np.cumsum(np.concatenate((np.zeros(attack), released)))
+    reduction = (total[attack:] - total[:-attack]) / attack
+
+    return (10 ** (-reduction / 20)).astype(np.float32)
+
+
+def limit(samples, block_frames=65536, **params):
+    """
+    Run a whole buffer through a Limiter a block at a time.
+
+    Parameters:
+    - samples: 1-D float numpy array at 16-bit scale.
+    - block_frames: Samples per block.
+    - params: Limiter settings.
+
+    Returns:
+    - float32 numpy array the length of samples.
+    """
+    blocks = (samples[start:start + block_frames] for start in range(0, len(samples), block_frames))
+    return np.concatenate(list(Limiter(**params).stream(blocks)))
@@ -0,0 +1,135 @@
+import numpy as np
+from pydub.utils import db_to_float
+
+import filters
+from delay import feedback_delay
+from dynamics import soft_clip
+from envelope import adsr, apply_envelope
+
+# Effects chains
+# --------------
+#
+# An instrument's effects as a list of stages that run one after the other on
+# a single float32 buffer, in place, at the mixer's 16-bit scale. Nothing is
+# rounded to int16 between stages, so a chain costs no more fidelity than its
+# effects do, and it only gets quantized once, at the very end (with dither),
+# or not at all when the notes go straight to the mixer.
+#
+# A chain is declared once per instrument and runs on a whole note table (one
+# note per row) in one go. Its stages are plain (name, params) pairs, so a
+# chain can also describe itself for the sample cache.
+
+INT16_MIN = -32768
+INT16_MAX = 32767
+
+
+def _gain(samples, sample_rate, volume):
+    samples *= np.float32(db_to_float(volume))
+
+
+def _clip(samples, sample_rate, low=INT16_MIN, high=INT16_MAX):
+    # What an int16 buffer does to anything pushed past full scale
+    np.clip(samples, low, high, out=samples)
+
+
+def _soft_clip(samples, sample_rate, drive=0.0, shape="tanh"):
+    soft_clip(samples, drive, shape, INT16_MAX)
+
+
+def _normalize(samples, sample_rate, headroom=0.1):
+    # Every note on its own, like AudioSegment.normalize()
+    peaks = np.abs(samples).max(axis=-1, keepdims=True)
+    target = np.float32(-INT16_MIN * db_to_float(-headroom))
+    np.divide(target, peaks, out=peaks, where=peaks > 0)
+    peaks[peaks == 0] = 1.0
+    samples *= peaks
+
+
+def _filter(samples, sample_rate, design, settle=False, **params):
+    samples[...] = filters.apply_filter(samples, getattr(filters, design)(sample_rate=sample_rate, **params), settle)
+
+
+def _delay(samples, sample_rate, delay_ms, feedback=0.0, mix=0.5):
+    samples[...] = feedback_delay(samples, delay_ms, feedback, mix, sample_rate)
+
+
+def _envelope(samples, sample_rate, attack, decay, sustain, release, curve="linear"):
+    apply_envelope(samples, adsr(attack, decay, sustain, release, samples.shape[-1], sample_rate, curve))
+
+
+# Stage name -> function(samples, sample_rate, **params) working in place
+EFFECTS = {
+    "gain": _gain,
+    "clip": _clip,
+    "soft_clip": _soft_clip,
+    "normalize": _normalize,
+    "filter": _filter,
+    "delay": _delay,
+    "envelope": _envelope,
+}
+
+
+def quantize(samples, dither=True, seed=0):
+    """
+    Round float samples at 16-bit scale to int16, once, at the output.
+
+    Parameters:
+    - samples: Float numpy array at the mixer's 16-bit scale.
+    - dither: Add triangular (TPDF) dither of +-1 LSB first, so the rounding
+              error is noise rather than distortion that follows the signal.
+    - seed: int seed of the dither, so renders stay reproducible, or a
+            numpy Generator to carry on one dither sequence across the blocks of a stream.
+
+    Returns:
+    - int16 numpy array of the same shape.
+    """
+    pcm = np.array(samples, dtype=np.float32)
+    if dither:
+        rng = np.random.default_rng(seed)
+        pcm += rng.random(pcm.shape, dtype=np.float32)
+        pcm -= rng.random(pcm.shape, dtype=np.float32)
+    np.rint(pcm, out=pcm)
+    np.clip(pcm, INT16_MIN, INT16_MAX, out=pcm)
+    return pcm.astype(np.int16)
+
+
+class Chain:
+    """
+    Effects chain, declared once and run on whole note tables.
+
+    Parameters:
+    - stages: List of (name, params) pairs, in order; name is a key of
+              EFFECTS and params a dict of its keyword arguments, e.g.
+              [("gain", {"volume": 15}), ("filter", {"design": "lowpass", "cutoff": 120})].
+    - sample_rate: Sample rate of the sounds it runs on.
+    """
+
+    def __init__(self, stages, sample_rate=44100):
+        unknown = [name for name, _ in stages if name not in EFFECTS]
+        if unknown:
+            raise KeyError(unknown[0])
+
+        self.stages = [(name, dict(params)) for name, params in stages]
+        self.sample_rate = sample_rate
+
+    def __call__(self, samples):
+        """
+        Run the chain on a copy of samples.
+
+        Parameters:
+        - samples: numpy array at 16-bit scale (int16 or float), 1-D or one note per row.
+
+        Returns:
+        - float32 numpy array, unquantized, ready for the mixer.
+        """
+        return self.run(np.array(samples, dtype=np.float32))
+
+    def run(self, samples):
+        """Run the chain in place on a float32 array and return it."""
+        for name, params in self.stages:
+            EFFECTS[name](samples, self.sample_rate, **params)
+        return samples
+
+    def describe(self):
+        """The stages as JSON-able data, e.g. for samplecache.cache_key()."""
+        return [[name, params] for name, params in self.stages]
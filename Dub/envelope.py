@@ -0,0 +1,165 @@
+import numpy as np
+
+# Envelope shapes
+# ---------------
+#
+# ADSR, AR, exponential decay and free multi-segment envelopes, built with a
+# couple of array operations for exactly the number of samples a sound has.
+# Shapes are memoized per (shape, parameters, sample rate, length), so every
+# note of an instrument shares one read-only array, and applying it is a
+# single in-place multiply.
+#
+# Segments can be linear or exponential. An exponential segment moves fast at
+# first and settles into its target, which is how analog envelopes sound.
+
+# Curvature used for curve="exp"
+EXP_CURVE = 5.0
+
+# Built shapes, the MAX_SHAPES most recently used ones, oldest first
+MAX_SHAPES = 128
+_shapes = {}
+
+
+def _curvature(curve):
+    if curve == "linear":
+        return 0.0
+    if curve == "exp":
+        return EXP_CURVE
+    return float(curve)
+
+
+def _memoized(key, build):
+    # Build a shape once per key and hand out the same read-only array after that
+    if key in _shapes:
+        # Move it to the end, so the least recently used shape is always first
+        _shapes[key] = _shapes.pop(key)
+        return _shapes[key]
+
+    shape = build()
+    shape.flags.writeable = False
+    _shapes[key] = shape
+    if len(_shapes) > MAX_SHAPES:
+        del _shapes[next(iter(_shapes))]
+    return shape
+
+
+def _segments(points, length, sample_rate, curvature, start):
+    # Breakpoints in samples, counted from the start of the envelope
+    durations = np.array([max(seconds, 0.0) for seconds, _ in points]) * sample_rate
+    breaks = np.concatenate(([0.0], np.cumsum(durations)))
+    levels = np.array([start] + [level for _, level in points], dtype=np.float64)
+
+    position = np.arange(length, dtype=np.float64)
+    if not curvature:
+        # np.interp holds the last level past the final breakpoint
+        return np.interp(position, breaks, levels)
+
+    # Which segment every sample is in, and how far along it
+    segment = np.clip(np.searchsorted(breaks, position, side="right") - 1, 0, len(points) - 1)
+    span = np.maximum(breaks[segment + 1] - breaks[segment], 1e-12)
+    fraction = np.clip((position - breaks[segment]) / span, 0.0, 1.0)
+
+    warped = -np.expm1(-curvature * fraction) / -np.expm1(-curvature)
+    return levels[segment] + (levels[segment + 1] - levels[segment]) * warped
+
+
+def segments(points, length, sample_rate=44100, curve="linear", start=0.0):
+    """
+    Multi-segment envelope.
+
+    Parameters:
+    - points: Sequence of (seconds, level) pairs: each segment moves to `level`
+              over `seconds`. The last level is held to the end.
+    - length: Length of the envelope in samples.
+    - sample_rate: Sample rate in Hz.
+    - curve: "linear", "exp", or a curvature number (0 is linear).
+    - start: Level at the first sample.
+
+    Returns:
+    - Read-only float64 array of `length` samples, shared between calls.
+    """
+    points = tuple((float(seconds), float(level)) for seconds, level in points)
+    curvature = _curvature(curve)
+    if not points:
+        points = ((0.0, start),)
+
+    key = ("segments", points, float(start), curvature, sample_rate, length)
+    return _memoized(key, lambda: _segments(points, length, sample_rate, curvature, start))
+
+
+def adsr(attack, decay, sustain, release, length, sample_rate=44100, curve="linear"):
+    """
+    ADSR envelope fitted into `length` samples.
+
+    The release always ends on the last sample. When the note is too short for
+    the whole shape, the attack, decay and release are shortened in proportion
+    until they fit, so there is never a negative sustain time.
+
+    Parameters:
+    - attack: Time to rise from 0 to 1, in seconds.
+    - decay: Time to fall from 1 to the sustain level, in seconds.
+    - sustain: Sustain level between 0 and 1.
+    - release: Time to fall from the sustain level to 0, in seconds.
+    - length: Length of the envelope in samples.
+    - sample_rate: Sample rate in Hz.
+    - curve: "linear", "exp", or a curvature number (0 is linear).
+
+    Returns:
+    - Read-only float64 array of `length` samples, shared between calls.
+    """
+    curvature = _curvature(curve)
+    key = ("adsr", float(attack), float(decay), float(sustain), float(release), curvature, sample_rate, length)
+
+    def build():
+        # Squeeze the timed stages into the note if they don't fit
+        total = (attack + decay + release) * sample_rate
+        scale = min(1.0, length / total) if total else 1.0
+
+        release_samples = min(int(release * scale * sample_rate), length)
+        held = length - release_samples
+
+        # Attack, decay and sustain up to the release, then the release from there
+        shape = np.empty(length)
+        shape[:held] = _segments(((attack * scale, 1.0), (decay * scale, sustain)), held, sample_rate, curvature, 0.0)
+        level = shape[held - 1] if held else 0.0
+        shape[held:] = _segments(((release_samples / sample_rate, 0.0),), release_samples + 1,
+                                 sample_rate, curvature, level)[1:]
+        return shape
+
+    return _memoized(key, build)
+
+
+def ar(attack, release, length, sample_rate=44100, curve="linear"):
+    """
+    Attack-release envelope: rise from 0 to 1, then fall back to 0 by the last sample.
+
+    Takes the same parameters as adsr(), without the decay and sustain.
+    """
+    return adsr(attack, 0.0, 1.0, release, length, sample_rate, curve)
+
+
+def decay(time_constant, length, sample_rate=44100):
+    """
+    Exponential decay that falls by 1/e every `time_constant` seconds.
+
+    Returns:
+    - Read-only float64 array of `length` samples, shared between calls.
+    """
+    key = ("decay", float(time_constant), sample_rate, length)
+    return _memoized(key, lambda: np.exp(-np.arange(length) / (time_constant * sample_rate)))
+
+
+def apply_envelope(samples, envelope):
+    """
+    Multiply samples by an envelope in place.
+
+    Parameters:
+    - samples: Writable float numpy array, 1-D or one sound per row; only
+               as much of the envelope as there are samples is used.
+    - envelope: Envelope from this module (or any array at least as long).
+
+    Returns:
+    - samples.
+    """
+    samples *= envelope[:samples.shape[-1]]
+    return samples
@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from pydub import AudioSegment
+
+from stream import write_wav
+
+# Export to several formats
+# -------------------------
+#
+# pydub's export() renders the whole song to a temporary WAV and runs ffmpeg
+# on it every time it is called, so writing an MP3 and a WAV (or the same MP3
+# twice) does all that work over again. Here the PCM is written once, to a
+# WAV, and every other format is encoded from that file, the encoders running
+# side by side in a small pool of processes.
+#
+# Every target remembers a hash of the PCM and encoder settings it was made
+# from, and a hash of the file itself, in a manifest next to it. A target
+# whose PCM and settings haven't changed, and whose file is still there as it
+# was written, is not encoded again.
+#
+# encode_stream() skips the WAV altogether: it pipes the PCM into ffmpeg's
+# stdin as the chunked renderer makes it, so encoding runs while the song is
+# still being rendered and nothing but the output file touches the disk.
+
+# Format -> (ffmpeg container, encoder arguments)
+FORMATS = {
+    "wav": ("wav", []),
+    "mp3": ("mp3", ["-codec:a", "libmp3lame", "-b:a", "192k"]),
+    "flac": ("flac", ["-codec:a", "flac"]),
+    "ogg": ("ogg", ["-codec:a", "libvorbis", "-q:a", "5"]),
+}
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _hashed(chunks, digest):
+    # Pass the chunks through, adding each one to digest on the way
+    for chunk in chunks:
+        digest.update(chunk.tobytes())
+        yield chunk
+
+
+def _encode(job):
+    # Run one encoder in a worker process: write under a temporary name and
+    # rename into place, so an interrupted run never leaves half a file
+    converter, source, path, container, arguments = job
+    partial = path + ".part"
+    command = [converter, "-y", "-loglevel", "error", "-i", source] + arguments + ["-f", container, partial]
+    try:
+        subprocess.run(command, check=True, stdin=subprocess.DEVNULL)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return _file_hash(path)
+
+
+def _load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def export(chunks, directory, name, formats=("wav", "mp3"), frame_rate=44100, channels=2, workers=None):
+    """
+    Write a song to several formats, encoding only what changed.
+
+    Parameters:
+    - chunks: Iterable of int16 mono numpy arrays, e.g. from stream.iter_chunks()
+              or [mixer.segment_to_array(song)].
+    - directory: Folder to write the files to.
+    - name: Base file name; the files are <name>.<format>.
+    - formats: Keys of FORMATS to write.
+    - frame_rate: Sample rate of the chunks.
+    - channels: Number of channels of the files; mono chunks are copied to every channel.
+    - workers: Most encoders to run at once, defaults to one per format (and
+               never more than one per core).
+
+    Returns:
+    - Dict of format -> path of the file, whether it was written now or before.
+    """
+    unknown = [fmt for fmt in formats if fmt not in FORMATS]
+    if unknown:
+        raise KeyError(unknown[0])
+
+    os.makedirs(directory, exist_ok=True)
+    paths = {fmt: os.path.join(directory, f"{name}.{fmt}") for fmt in formats}
+    manifest_path = os.path.join(directory, f".{name}.export.json")
+    manifest = _load_manifest(manifest_path)
+
+    # Write the PCM once, hashing it on the way
+    digest = hashlib.sha256(f"{frame_rate}:{channels}".encode())
+    handle, source = tempfile.mkstemp(suffix=".wav", dir=directory)
+    os.close(handle)
+
+    try:
+        write_wav(source, _hashed(chunks, digest), frame_rate, channels)
+        pcm_hash = digest.hexdigest()
+
+        def key(fmt):
+            return hashlib.sha256(json.dumps([pcm_hash, FORMATS[fmt]]).encode()).hexdigest()
+
+        def unchanged(fmt):
+            entry = manifest.get(fmt, {})
+            return (entry.get("key") == key(fmt) and os.path.exists(paths[fmt])
+                    and entry.get("output") == _file_hash(paths[fmt]))
+
+        stale = [fmt for fmt in formats if not unchanged(fmt)]
+        encoded = [fmt for fmt in stale if fmt != "wav"]
+
+        if encoded:
+            jobs = [(AudioSegment.converter, source, paths[fmt]) + FORMATS[fmt] for fmt in encoded]
+            workers = min(workers or len(jobs), len(jobs), os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for fmt, output in zip(encoded, pool.map(_encode, jobs)):
+                    manifest[fmt] = {"key": key(fmt), "output": output}
+
+        # The WAV target is the PCM file itself, moved into place once the encoders are done with it
+        if "wav" in stale:
+            os.replace(source, paths["wav"])
+            manifest["wav"] = {"key": key("wav"), "output": _file_hash(paths["wav"])}
+    finally:
+        if os.path.exists(source):
+            os.remove(source)
+
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    return paths
+
+
+def encode_stream(chunks, path, fmt="mp3", frame_rate=44100, channels=2):
+    """
+    Encode a song with ffmpeg while it is being rendered.
+
+    The chunks are written to ffmpeg's stdin as they come, so rendering and
+    encoding overlap: ffmpeg works on one chunk while the next is rendered.
+
+    Parameters:
+    - chunks: Iterable of int16 mono numpy arrays, e.g. from stream.iter_chunks().
+    - path: Output file path.
+    - fmt: Key of FORMATS.
+    - frame_rate: Sample rate of the chunks.
+    - channels: Number of channels of the file; mono chunks are copied to every channel.
+
+    Returns:
+    - Dict with the throughput: "frames" encoded, "audio_seconds" of audio,
+      "seconds" it all took, "render_seconds" spent waiting on the chunks,
+      "encode_seconds" spent waiting on ffmpeg to take them, and "speed",
+      how many times faster than real time the whole thing ran.
+    """
+    container, arguments = FORMATS[fmt]
+    partial = path + ".part"
+    command = ([AudioSegment.converter, "-y", "-loglevel", "error",
+                "-f", "s16le", "-ar", str(frame_rate), "-ac", str(channels), "-i", "pipe:0"]
+               + arguments + ["-f", container, partial])
+
+    frames = 0
+    render_seconds = encode_seconds = 0.0
+    start = time.perf_counter()
+
+    # ffmpeg's messages go to a file: a pipe nobody reads while the PCM is
+    # written would fill up and stall the encoder, and the render with it
+    log = tempfile.TemporaryFile()
+    encoder = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=log)
+
+    try:
+        chunks = iter(chunks)
+        while True:
+            before = time.perf_counter()
+            chunk = next(chunks, None)
+            render_seconds += time.perf_counter() - before
+            if chunk is None:
+                break
+
+            if channels > 1:
+                chunk = np.repeat(chunk, channels)
+            before = time.perf_counter()
+            try:
+                encoder.stdin.write(chunk.tobytes())
+            except BrokenPipeError:
+                break  # ffmpeg gave up; its error is reported below
+            encode_seconds += time.perf_counter() - before
+            frames += len(chunk) // channels
+
+        # Closing stdin ends the stream; ffmpeg then finishes the file
+        before = time.perf_counter()
+        encoder.communicate()
+        encode_seconds += time.perf_counter() - before
+        if encoder.returncode:
+            log.seek(0)
+            raise subprocess.CalledProcessError(encoder.returncode, command, stderr=log.read())
+        os.replace(partial, path)
+    finally:
+        if encoder.poll() is None:
+            encoder.kill()
+            encoder.wait()
+        log.close()
+        if os.path.exists(partial):
+            os.remove(partial)
+
+    seconds = time.perf_counter() - start
+    audio_seconds = frames / frame_rate
+    return {
+        "frames": frames,
+        "audio_seconds": audio_seconds,
+        "seconds": seconds,
+        "render_seconds": render_seconds,
+        "encode_seconds": encode_seconds,
+        "speed": audio_seconds / seconds if seconds else float("inf"),
+    }
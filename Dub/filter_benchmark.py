@@ -0,0 +1,29 @@
+import timeit
+
+import numpy as np
+
+from filters import apply_filter, lowpass, one_pole_lowpass
+from mixer import segment_to_array
+from oscillators import create_wave
+from wavetable import apply_gain, note_table
+
+# Compare the filter bank against pydub's low_pass_filter on the bass table
+# -------------------------------------------------------------------------
+
+# The song5 bass notes (an octave apart), then a full four octave table
+for frequencies in [[65.405 / 2.0, 65.405], [32.7 * 2 ** (i / 12) for i in range(48)]]:
+    notes = [create_wave("saw", frequency, 250).apply_gain(15) for frequency in frequencies]
+    table = apply_gain(note_table("saw", np.array(frequencies)[:, None], 250), 15)
+
+    # The same samples either way
+    pydub_notes = np.stack([segment_to_array(note.low_pass_filter(120)) for note in notes])
+    one_pole = np.trunc(apply_filter(table, one_pole_lowpass(120), settle=True)).astype(np.int16)
+    assert np.array_equal(pydub_notes, one_pole)
+
+    # Best of a few runs, to keep other load on the machine out of it
+    runs = 3
+    old = min(timeit.repeat(lambda: [note.low_pass_filter(120) for note in notes], number=runs, repeat=3)) / runs
+    new = min(timeit.repeat(lambda: apply_filter(table, one_pole_lowpass(120), settle=True), number=runs, repeat=3)) / runs
+    rbj = min(timeit.repeat(lambda: apply_filter(table, lowpass(120)), number=runs, repeat=3)) / runs
+    print(f"{len(notes):3d} notes: low_pass_filter {old * 1000:8.2f} ms, "
+          f"one-pole {new * 1000:6.3f} ms ({old / new:4.0f}x faster), RBJ low pass {rbj * 1000:6.3f} ms")
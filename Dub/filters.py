@@ -0,0 +1,163 @@
+import math
+
+import numpy as np
+from scipy.signal import sosfilt, sosfilt_zi
+
+# Biquad filter bank
+# ------------------
+#
+# Low pass, high pass, band pass and shelf filters from the RBJ Audio EQ
+# Cookbook, plus pydub's one-pole low pass, all designed as second-order
+# sections and run by scipy's sosfilt, which does the per-sample recursion in
+# C. Filters run along the last axis, so a whole note table (one note per
+# row) is filtered in one call, and stacking sections (np.vstack) gives
+# steeper slopes.
+#
+# Every design function takes numbers or arrays: an array of cutoffs gives one
+# section per cutoff, which is what sweep() uses to automate the cutoff.
+
+
+def _section(b0, b1, b2, a0, a1, a2):
+    # Normalized (..., 6) second-order sections
+    return np.stack(np.broadcast_arrays(b0 / a0, b1 / a0, b2 / a0, a0 / a0, a1 / a0, a2 / a0), axis=-1)
+
+
+def _angle(frequency, q, sample_rate):
+    w0 = 2 * np.pi * np.asarray(frequency, dtype=np.float64) / sample_rate
+    return np.cos(w0), np.sin(w0) / (2 * q)
+
+
+def lowpass(cutoff, q=1 / math.sqrt(2), sample_rate=44100):
+    """
+    RBJ low pass: 12dB per octave above the cutoff.
+
+    Parameters:
+    - cutoff: Cutoff frequency in Hz (number or array).
+    - q: Resonance; 1/sqrt(2) is the flattest pass band.
+    - sample_rate: Sample rate in Hz.
+
+    Returns:
+    - Second-order sections, (1, 6) for one cutoff or (cutoffs, 6).
+    """
+    cos, alpha = _angle(cutoff, q, sample_rate)
+    return _section((1 - cos) / 2, 1 - cos, (1 - cos) / 2, 1 + alpha, -2 * cos, 1 - alpha).reshape(-1, 6)
+
+
+def highpass(cutoff, q=1 / math.sqrt(2), sample_rate=44100):
+    """RBJ high pass: 12dB per octave below the cutoff; takes the same parameters as lowpass()."""
+    cos, alpha = _angle(cutoff, q, sample_rate)
+    return _section((1 + cos) / 2, -(1 + cos), (1 + cos) / 2, 1 + alpha, -2 * cos, 1 - alpha).reshape(-1, 6)
+
+
+def bandpass(center, q=1.0, sample_rate=44100):
+    """RBJ band pass with a 0dB peak at the center; a higher q makes the band narrower."""
+    cos, alpha = _angle(center, q, sample_rate)
+    return _section(alpha, 0.0 * cos, -alpha, 1 + alpha, -2 * cos, 1 - alpha).reshape(-1, 6)
+
+
+def _shelf(cutoff, gain_db, q, sample_rate):
+    cos, alpha = _angle(cutoff, q, sample_rate)
+    a = 10 ** (np.asarray(gain_db, dtype=np.float64) / 40)
+    return cos, 2 * np.sqrt(a) * alpha, a
+
+
+def low_shelf(cutoff, gain_db, q=1 / math.sqrt(2), sample_rate=44100):
+    """
+    RBJ low shelf: boost or cut everything below the cutoff by gain_db.
+
+    Parameters:
+    - cutoff: Shelf frequency in Hz (number or array).
+    - gain_db: Gain of the shelf in dB, negative to cut.
+    - q: Steepness of the shelf; 1/sqrt(2) is the steepest without a bump.
+    - sample_rate: Sample rate in Hz.
+
+    Returns:
+    - Second-order sections, as for lowpass().
+    """
+    cos, beta, a = _shelf(cutoff, gain_db, q, sample_rate)
+    return _section(a * ((a + 1) - (a - 1) * cos + beta),
+                    2 * a * ((a - 1) - (a + 1) * cos),
+                    a * ((a + 1) - (a - 1) * cos - beta),
+                    (a + 1) + (a - 1) * cos + beta,
+                    -2 * ((a - 1) + (a + 1) * cos),
+                    (a + 1) + (a - 1) * cos - beta).reshape(-1, 6)
+
+
+def high_shelf(cutoff, gain_db, q=1 / math.sqrt(2), sample_rate=44100):
+    """RBJ high shelf: boost or cut everything above the cutoff; takes the same parameters as low_shelf()."""
+    cos, beta, a = _shelf(cutoff, gain_db, q, sample_rate)
+    return _section(a * ((a + 1) + (a - 1) * cos + beta),
+                    -2 * a * ((a - 1) + (a + 1) * cos),
+                    a * ((a + 1) + (a - 1) * cos - beta),
+                    (a + 1) - (a - 1) * cos + beta,
+                    2 * ((a - 1) - (a + 1) * cos),
+                    (a + 1) - (a - 1) * cos - beta).reshape(-1, 6)
+
+
+def one_pole_lowpass(cutoff, sample_rate=44100):
+    """
+    pydub's low_pass_filter(): a one-pole RC low pass, 6dB per octave above the cutoff.
+
+    Returns:
+    - Second-order sections, as for lowpass().
+    """
+    rc = 1.0 / (np.asarray(cutoff, dtype=np.float64) * 2 * math.pi)
+    dt = 1.0 / sample_rate
+    alpha = dt / (rc + dt)
+    return _section(alpha, 0.0, 0.0, 1.0, alpha - 1, 0.0).reshape(-1, 6)
+
+
+def apply_filter(samples, sos, settle=False):
+    """
+    Run second-order sections over samples.
+
+    Parameters:
+    - samples: numpy array, 1-D or one sound per row.
+    - sos: Second-order sections from this module.
+    - settle: Start every row as if its first sample had always been there,
+              like pydub's filters do, instead of from silence.
+
+    Returns:
+    - New float64 array shaped like samples.
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    if not settle:
+        return sosfilt(sos, samples, axis=-1)
+
+    # sosfilt_zi is the state after a constant input of 1, so scale it by each row's first sample
+    first = samples[..., :1]
+    zi = sosfilt_zi(sos).reshape((len(sos),) + (1,) * (samples.ndim - 1) + (2,)) * first[None]
+    filtered, _ = sosfilt(sos, samples, axis=-1, zi=zi)
+    return filtered
+
+
+def sweep(samples, design, cutoff, block_size=64, sample_rate=44100, **params):
+    """
+    Run a filter whose cutoff moves over time.
+
+    The coefficients are redesigned every block_size samples and the filter's
+    state carries over from block to block, so the sweep has no clicks.
+
+    Parameters:
+    - samples: numpy array, 1-D or one sound per row; every row gets the same sweep.
+    - design: lowpass, highpass, bandpass, low_shelf or high_shelf.
+    - cutoff: Cutoff in Hz for every sample, e.g. from modulation.Modulation.cutoff().
+    - block_size: Samples between coefficient updates.
+    - sample_rate: Sample rate in Hz.
+    - params: Any other parameters of design, e.g. q or gain_db.
+
+    Returns:
+    - New float64 array shaped like samples.
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    length = samples.shape[-1]
+    starts = np.arange(0, length, block_size)
+    cutoffs = np.broadcast_to(np.asarray(cutoff, dtype=np.float64), (length,))[starts]
+    sections = design(cutoffs, sample_rate=sample_rate, **params)
+
+    filtered = np.empty(samples.shape)
+    zi = np.zeros((1,) + samples.shape[:-1] + (2,))
+    for section, start in zip(sections, starts):
+        block = slice(start, start + block_size)
+        filtered[..., block], zi = sosfilt(section[None], samples[..., block], axis=-1, zi=zi)
+    return filtered
@@ -0,0 +1,184 @@
+import numpy as np
+
+from envelope import adsr, apply_envelope
+from oscillators import phase, to_pcm, to_segment
+from wavetable import LazyNoteTable, chromatic_frequencies
+
+# FM and additive synthesis
+# -------------------------
+#
+# Offline versions of the pyo patches in sounds/: stacks of sine operators
+# rendered as whole numpy arrays, so they don't need a booted pyo Server or a
+# sound card and render much faster than real time. A patch is a list of
+# operators. Every operator is a sine at a ratio of the note's frequency, and
+# either goes to the output or modulates an operator further down the list,
+# so a two operator FM pair, a DX-style stack and an additive organ (all
+# carriers, one per partial) are all just patches.
+#
+# Like the oscillators, a (notes, 1) column of frequencies renders one note
+# per row in the same array operations, so a patch can be a note table.
+
+
+def operator(ratio=1.0, level=1.0, into=None, mode="phase", envelope=None, curve="linear", fixed=None):
+    """
+    Describe one sine operator of a patch.
+
+    Parameters:
+    - ratio: Frequency as a multiple of the note's frequency.
+    - level: Output level. For a carrier it's the amplitude, for a modulator
+             the modulation index (radians in "phase" mode, Hz in "frequency" mode).
+    - into: Index in the patch of the operator this one modulates, or None to
+            send it to the output. Only operators further down the patch can
+            be modulated.
+    - mode: How a modulator acts on its target: "phase" adds to the target's
+            phase (classic FM), "frequency" adds to its frequency in Hz, the
+            way pyo's Sine(freq=f + mod) does.
+    - envelope: (attack, decay, sustain, release) in seconds, as for
+                envelope.adsr(), fitted to every note; None keeps the level
+                constant. On a modulator this is the index envelope.
+    - curve: Envelope curve, "linear" or "exp".
+    - fixed: Frequency in Hz that ignores the note, instead of the ratio.
+
+    Returns:
+    - Dict describing the operator.
+    """
+    return {
+        "ratio": ratio,
+        "level": level,
+        "into": into,
+        "mode": mode,
+        "envelope": tuple(envelope) if envelope is not None else None,
+        "curve": curve,
+        "fixed": fixed,
+    }
+
+
+def additive(partials, envelope=None, curve="linear"):
+    """
+    Additive patch: one carrier per partial.
+
+    Parameters:
+    - partials: Sequence of (ratio, level) pairs.
+    - envelope, curve: Envelope shared by every partial, as for operator().
+
+    Returns:
+    - Patch (list of operators).
+    """
+    return [operator(ratio, level, envelope=envelope, curve=curve) for ratio, level in partials]
+
+
+def render(patch, frequency, num_samples, sample_rate=44100):
+    """
+    Render a patch.
+
+    Parameters:
+    - patch: List of operators, see operator().
+    - frequency: Frequency of the note in Hz, or a (notes, 1) column of them
+                 to render one note per row.
+    - num_samples: Number of samples per note.
+    - sample_rate: Sample rate in Hz.
+
+    Returns:
+    - float32 numpy array of num_samples samples (notes x num_samples for a column).
+    """
+    frequency = np.asarray(frequency, dtype=np.float64)
+    shape = (num_samples,) if frequency.ndim == 0 else (len(frequency), num_samples)
+    output = np.zeros(shape, dtype=np.float32)
+
+    # Modulation arriving at every operator, by mode
+    inputs = [{} for _ in patch]
+
+    for index, op in enumerate(patch):
+        if op["into"] is not None and not index < op["into"] < len(patch):
+            raise ValueError("operator %d can only modulate a later operator, not %r" % (index, op["into"]))
+
+        pitch = op["fixed"] if op["fixed"] is not None else op["ratio"] * frequency
+        if "frequency" in inputs[index]:
+            # A per-sample frequency, integrated by phase() so the phase stays continuous
+            pitch = pitch + inputs[index]["frequency"]
+
+        # The phase is kept in float64, float32 is plenty for the sine itself
+        angle = (phase(pitch, num_samples, sample_rate) * (2 * np.pi)).astype(np.float32)
+        if "phase" in inputs[index]:
+            angle = angle + inputs[index]["phase"]
+
+        wave = np.sin(angle, out=angle)
+        wave *= np.float32(op["level"])
+        if op["envelope"] is not None:
+            apply_envelope(wave, adsr(*op["envelope"], num_samples, sample_rate, op["curve"]))
+
+        if op["into"] is None:
+            output += wave
+        else:
+            modulation = inputs[op["into"]]
+            modulation[op["mode"]] = wave + modulation[op["mode"]] if op["mode"] in modulation else wave
+
+    return output
+
+
+def fm_table(patch, frequencies, duration_ms, volume=0.0, sample_rate=44100):
+    """
+    Render one note of a patch per row, like wavetable.note_table().
+
+    Parameters:
+    - patch: List of operators, see operator().
+    - frequencies: (notes, 1) column of frequencies, e.g. from chromatic_frequencies().
+    - duration_ms: Length of every note in milliseconds.
+    - volume: Gain in dB, 0 for full scale.
+    - sample_rate: Sample rate in Hz.
+
+    Returns:
+    - int16 numpy array of notes x samples.
+    """
+    num_samples = int(sample_rate * duration_ms / 1000.0)
+    return to_pcm(render(patch, frequencies, num_samples, sample_rate), volume)
+
+
+def fm_instrument(patch, base_frequency, duration_ms, notes=12, volume=0.0, sample_rate=44100):
+    """
+    Lazy chromatic note table of a patch, for the sequencers and the mixer.
+
+    Parameters:
+    - patch: List of operators, see operator().
+    - base_frequency: Frequency of note 1 in Hz; note n is n - 1 semitones above it.
+    - duration_ms, volume, sample_rate: As for fm_table().
+    - notes: Number of notes in the table.
+
+    Returns:
+    - LazyNoteTable of note index (1 to notes) -> int16 samples. The notes a
+      song plays are rendered together as one table.
+    """
+    def synthesize(indices):
+        frequencies = chromatic_frequencies(base_frequency, steps=np.asarray(indices) - 1)
+        return fm_table(patch, frequencies, duration_ms, volume, sample_rate)
+
+    return LazyNoteTable(synthesize, range(1, notes + 1))
+
+
+def create_fm(patch, frequency, duration_ms, volume=0.0, sample_rate=44100):
+    """
+    Create an AudioSegment of one note of a patch.
+
+    Parameters:
+    - patch: List of operators, see operator().
+    - frequency: Frequency in Hz.
+    - duration_ms, volume, sample_rate: As for fm_table().
+
+    Returns:
+    - 16-bit mono AudioSegment.
+    """
+    num_samples = int(sample_rate * duration_ms / 1000.0)
+    return to_segment(render(patch, frequency, num_samples, sample_rate), sample_rate, volume)
+
+
+# The patches of sounds/create_sounds.py
+# --------------------------------------
+
+# Sine(freq=440, mul=Adsr(attack=0.1, decay=0.2, sustain=0.5, release=0.1))
+SINE_WITH_ENVELOPE = [operator(1.0, 1.0, envelope=(0.1, 0.2, 0.5, 0.1))]
+
+# mod = Sine(freq=freq * 6, mul=0.1); Sine(freq=freq + mod, mul=0.3)
+PLUCKED_STRING = [
+    operator(6.0, 0.1, into=1, mode="frequency"),
+    operator(1.0, 0.3),
+]
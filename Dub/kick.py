@@ -0,0 +1,82 @@
+import numpy as np
+from pydub import AudioSegment
+
+from envelope import apply_envelope, decay
+from noise import white_noise
+
+# Kick drum engine
+# ----------------
+#
+# One vectorized kick shared by every song. The pitch sweep comes from a phase
+# accumulator (np.cumsum over the per-sample frequency), so the whole body is a
+# single array operation with continuous phase, instead of overlaying a fresh
+# 1 ms Sine segment for every millisecond of the kick.
+
+
+def db_to_gain(db):
+    """Convert decibels to a linear amplitude factor."""
+    return 10 ** (db / 20.0)
+
+
+def kick_samples(duration_ms, start_frequency=150.0, end_frequency=50.0, sweep=1.0,
+                 click="noise", click_length=0.05, click_db=-30.0, decay_ms=None,
+                 gain_db=6.0, sample_rate=44100, seed=0):
+    """
+    Synthesize a kick drum as a float array.
+
+    Parameters:
+    - duration_ms: Length of the kick in milliseconds.
+    - start_frequency: Pitch at the start of the kick in Hz.
+    - end_frequency: Pitch the kick falls to in Hz.
+    - sweep: Fraction of the kick the pitch takes to fall; it holds at end_frequency after that.
+    - click: "noise" for a white noise click, a frequency in Hz for a sine click, or None.
+    - click_length: Length of the click as a fraction of the kick.
+    - click_db: Level of the click relative to the body.
+    - decay_ms: Time for the body to decay by 1/e, or None to keep it at full level.
+    - gain_db: Gain applied to the finished kick; anything past full scale is clipped.
+    - sample_rate: Sample rate in Hz.
+    - seed: int seed or numpy Generator for the noise click (see noise.py).
+
+    Returns:
+    - float64 numpy array of samples between -1 and 1.
+    """
+    num_samples = int(sample_rate * duration_ms / 1000.0)
+
+    # Pitch envelope: a linear fall over the first part of the kick, then hold
+    sweep_samples = int(num_samples * sweep)
+    frequency = np.full(num_samples, float(end_frequency))
+    frequency[:sweep_samples] = np.linspace(start_frequency, end_frequency, sweep_samples)
+
+    # Integrating the frequency keeps the phase continuous through the sweep
+    phase = np.cumsum(frequency) / sample_rate
+    kick = np.sin(2 * np.pi * phase)
+
+    # Amplitude envelope
+    if decay_ms:
+        apply_envelope(kick, decay(decay_ms / 1000.0, num_samples, sample_rate))
+
+    # Click layer on the attack
+    click_samples = min(int(sample_rate * int(duration_ms * click_length) / 1000.0), num_samples)
+    if click is not None and click_samples:
+        if click == "noise":
+            layer = white_noise(click_samples, seed)
+        else:
+            layer = np.sin(2 * np.pi * click * np.arange(click_samples) / sample_rate)
+        kick[:click_samples] += layer * db_to_gain(click_db)
+
+    kick *= db_to_gain(gain_db)
+    return np.clip(kick, -1.0, 1.0)
+
+
+def create_kick(duration_ms, sample_rate=44100, **params):
+    """
+    Create a kick drum AudioSegment.
+
+    Takes the same parameters as kick_samples().
+
+    Returns:
+    - 16-bit mono AudioSegment.
+    """
+    kick = kick_samples(duration_ms, sample_rate=sample_rate, **params)
+    pcm = (kick * 32767).astype(np.int16)
+    return AudioSegment(pcm.tobytes(), frame_rate=sample_rate, sample_width=2, channels=1)
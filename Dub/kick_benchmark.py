@@ -0,0 +1,34 @@
+import timeit
+
+from pydub.generators import Sine
+
+from kick import create_kick
+
+# Compare the vectorized kick engine against the old 1 ms overlay loop
+# --------------------------------------------------------------------
+
+
+def create_kick_drum_loop(duration_ms, start_frequency=150.0, end_frequency=50.0):
+    """The old kick: one 1 ms Sine segment overlaid per millisecond (from song.py/loop.py)."""
+    sine_kick = Sine(start_frequency).to_audio_segment(duration=duration_ms)
+
+    for i in range(duration_ms):
+        ratio = i / duration_ms
+        frequency = start_frequency + ratio * (end_frequency - start_frequency)
+        sine_segment = Sine(frequency).to_audio_segment(duration=1)
+        sine_kick = sine_kick.overlay(sine_segment, position=i)
+
+    return sine_kick + 6
+
+
+def create_kick_drum_engine(duration_ms, start_frequency=150.0, end_frequency=50.0):
+    """The same kick from the shared engine."""
+    return create_kick(duration_ms, start_frequency=start_frequency, end_frequency=end_frequency,
+                       click=None, gain_db=6)
+
+
+for duration_ms in [125, 250, 500, 1000]:
+    runs = 3
+    old = timeit.timeit(lambda: create_kick_drum_loop(duration_ms), number=runs) / runs
+    new = timeit.timeit(lambda: create_kick_drum_engine(duration_ms), number=runs) / runs
+    print(f"{duration_ms:5d} ms kick: loop {old * 1000:8.2f} ms, engine {new * 1000:6.3f} ms, {old / new:7.0f}x faster")
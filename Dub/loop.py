@@ -1,8 +1,11 @@
 import os
 from pydub import AudioSegment
-from pydub.generators import Sawtooth, Sine, WhiteNoise
 from pydub.playback import play
 
+from kick import create_kick
+from noise import create_noise
+from oscillators import create_wave
+
 # Setup sound parameters
 # -----------------------
 
@@ -23,45 +26,23 @@ def create_kick_drum(duration_ms):
     """
     Create a simple kick drum sound.
     """
-    # Initial and final frequencies for our kick drum sound
-    start_frequency = 150  # Start from a higher frequency
-    end_frequency = 50     # Drop to a lower frequency
-    
-    # Generate the initial sine wave at the start frequency
-    sine_kick = Sine(start_frequency).to_audio_segment(duration=duration_ms)
-    
-    # Create a frequency sweep (pitch envelope) from the start to end frequency
-    # This is a simple method to simulate the characteristic of a kick drum where the pitch drops rapidly.
-    for i in range(duration_ms):
-        # Calculate frequency drop ratio
-        ratio = i / duration_ms
-        frequency = start_frequency - ratio * (start_frequency - end_frequency)
-        
-        # Overlay the sine wave segment with the adjusted frequency
-        sine_segment = Sine(frequency).to_audio_segment(duration=1)  # 1ms segment
-        sine_kick = sine_kick.overlay(sine_segment, position=i)
-    
-    # The generated sound might be a bit quiet, so let's increase its volume (amplify it)
-    amplified_kick = sine_kick + 6  # Increase volume by 6dB, adjust as needed
-    
-    return amplified_kick
+    # The pitch drops rapidly from 150 Hz to 50 Hz, then 6dB louder
+    return create_kick(duration_ms, start_frequency=150, end_frequency=50, click=None, gain_db=6)
 
 
-def create_white_noise(duration_ms):
-    """Create a white noise audio segment."""
-    noise = WhiteNoise().to_audio_segment(duration=duration_ms)
+def create_white_noise(duration_ms, seed=3):
+    """Create a white noise audio segment, the same for the same seed."""
+    noise = create_noise("white", duration_ms, seed)
     return noise
 
 def create_sawtooth_wave(frequency, duration_ms):
     """Create a sawtooth wave audio segment."""
-    sawtooth_wave = Sawtooth(frequency)
-    sawtooth_audio = sawtooth_wave.to_audio_segment(duration=duration_ms)
+    sawtooth_audio = create_wave("saw", frequency, duration_ms)
     return sawtooth_audio
 
 def create_sine_wave(frequency, duration_ms):
     """Create a sine wave audio segment."""
-    sine_wave = Sine(frequency)
-    sine_audio = sine_wave.to_audio_segment(duration=duration_ms)
+    sine_audio = create_wave("sine", frequency, duration_ms)
     return sine_audio
 
 # Creating sound segments
@@ -0,0 +1,360 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from pydub import AudioSegment
+
+from dynamics import duck, duck_stem
+from effects import quantize
+from wavetable import LazyNoteTable
+
+# Mix bus for the Dub sequencer
+# -----------------------------
+#
+# The old sequencer built every track out of one AudioSegment per step and
+# overlaid everything with pydub, which copies the whole buffer on every call.
+# Here a block is mixed into one preallocated float32 buffer instead: the
+# compiled event table (see schedule.py) says where every note starts, each
+# note is added in place at that sample offset, and the result is only turned
+# back into 16-bit audio once, at the very end.
+#
+# Sidechain ducking fits in the same way: the gain envelope is worked out once
+# per block from the key track, the ducked tracks are mixed first, and the
+# whole of them is turned down with one multiply before the rest goes in.
+
+# 16-bit PCM limits
+INT16_MIN = -32768
+INT16_MAX = 32767
+
+
+def segment_to_array(segment):
+    """Return the samples of a 16-bit mono AudioSegment as an int16 numpy array."""
+    return np.frombuffer(segment.raw_data, dtype=np.int16)
+
+
+def to_audio_segment(samples, frame_rate=44100, dither=True):
+    """
+    Convert a mix buffer to a 16-bit mono AudioSegment.
+
+    Parameters:
+    - samples: numpy array of samples in 16-bit range (float or int).
+    - frame_rate: Sample rate of the buffer.
+    - dither: Dither float samples as they are quantized, see effects.quantize().
+
+    Returns:
+    - AudioSegment holding the int16 samples; int16 input is used as it is.
+    """
+    pcm = samples if samples.dtype == np.int16 else quantize(samples, dither)
+    return AudioSegment(pcm.tobytes(), frame_rate=frame_rate, sample_width=2, channels=1)
+
+
+def resample(samples, frame_rate, new_frame_rate):
+    """Resample a buffer the same way pydub's set_frame_rate() does."""
+    # Sounds on their way into the mix, not the output, so they are only rounded
+    segment = to_audio_segment(samples, frame_rate, dither=False).set_frame_rate(new_frame_rate)
+    return segment_to_array(segment).astype(np.float32)
+
+
+def mix_samples(sound, frame_rate=44100):
+    """
+    Convert one sound to float32 samples at the mix rate.
+
+    Parameters:
+    - sound: AudioSegment, or a numpy array of samples in the 16-bit range
+             already at the mix rate (float32 arrays are used without a copy).
+    - frame_rate: Sample rate of the mix.
+    """
+    if isinstance(sound, np.ndarray):
+        return sound.astype(np.float32, copy=False)
+
+    samples = segment_to_array(sound).astype(np.float32)
+    if sound.frame_rate != frame_rate:
+        samples = resample(samples, sound.frame_rate, frame_rate)
+    return samples
+
+
+def build_voices(sound_map, frame_rate=44100):
+    """
+    Turn the sequencer's sound map into the voice list the mixer plays from.
+
+    Every sound is converted to float32 at the mix rate once, up front. Lazy
+    note tables (wavetable.LazyNoteTable) stay lazy: a note is only
+    synthesized and converted the first time it is played or prewarmed.
+
+    Parameters:
+    - sound_map: Dict of track name -> ("drum", sound) or ("note", note_table),
+                 where a sound is an AudioSegment or a numpy array (see
+                 mix_samples()) and note_table maps note indices to sounds.
+    - frame_rate: Sample rate of the mix.
+
+    Returns:
+    - List of (name, kind, note_table) tuples, where note_table maps a note
+      index to float32 samples (drums have a single entry under 1). A voice's
+      position in the list is its voice id in the event table.
+    """
+    voices = []
+
+    for name, (kind, sounds) in sound_map.items():
+        if isinstance(sounds, LazyNoteTable):
+            table = sounds.convert(lambda sound: mix_samples(sound, frame_rate))
+        else:
+            notes = {1: sounds} if kind == "drum" else sounds
+            table = {note: mix_samples(sound, frame_rate) for note, sound in notes.items()}
+        voices.append((name, kind, table))
+
+    return voices
+
+
+def prewarm(voices, event_tables):
+    """
+    Synthesize every note the events play from lazy note tables, up front.
+
+    Each table gets the exact set of notes it needs in one batch, instead of
+    one note at a time in the middle of the mix.
+
+    Parameters:
+    - voices: Voice list from build_voices().
+    - event_tables: Iterable of event tables from schedule.compile_block().
+    """
+    played = {}
+    for events in event_tables:
+        for voice, note in zip(events["voice"].tolist(), events["note"].tolist()):
+            played.setdefault(voice, set()).add(note)
+
+    for voice, (_, _, table) in enumerate(voices):
+        if isinstance(table, LazyNoteTable) and voice in played:
+            table.prewarm(played[voice])
+
+
+def _add_events(bus, events, voices):
+    # Add every note of the event table into bus in place. Only the notes that
+    # play are touched, so the cost follows the note count and rests are free.
+    # Returns the (start, end) span that was written to.
+    length = len(bus)
+    start, stop = length, 0
+    scaled = {}
+
+    for onset, voice, note, gain in events.tolist():
+        if onset >= length:
+            continue
+
+        # Scale each sound once per block rather than once per hit
+        key = (voice, note, gain)
+        if key not in scaled:
+            scaled[key] = gain * voices[voice][2][note]
+
+        sample = scaled[key]
+        end = min(onset + len(sample), length)
+        bus[onset:end] += sample[:end - onset]
+        start, stop = min(start, onset), max(stop, end)
+
+    return start, stop
+
+
+def _clip(bus, span):
+    # Saturate the part of bus that has sound in it
+    start, stop = span
+    if stop > start:
+        np.clip(bus[start:stop], INT16_MIN, INT16_MAX, out=bus[start:stop])
+
+
+def sidechain_gain(events, voices, length, key="kick", source="events", **params):
+    """
+    Ducking gain for a block, keyed from one of its tracks.
+
+    Parameters:
+    - events, voices, length: As for mix_events().
+    - key: Name of the track that does the ducking.
+    - source: "events" to key from the track's onsets (see dynamics.duck()),
+              or "stem" to key from the sound of it (see dynamics.duck_stem()).
+    - params: Settings of duck() or duck_stem(), e.g. depth_db or release_ms.
+
+    Returns:
+    - float32 numpy array of `length` linear gains.
+    """
+    voice_ids = {name: i for i, (name, _, _) in enumerate(voices)}
+    keyed = events[events["voice"] == voice_ids[key]]
+
+    if source == "stem":
+        stem = np.zeros(length, dtype=np.float32)
+        _add_events(stem, keyed, voices)
+        return duck_stem(stem, **params)
+    if source == "events":
+        return duck(keyed["onset"], length, **params)
+    raise ValueError(f"Unknown sidechain source: {source}")
+
+
+def _split_sidechain(events, voices, sidechain):
+    # The events of the ducked tracks, the rest, and the sidechain_gain() settings
+    settings = {name: value for name, value in sidechain.items() if name != "tracks"}
+    ducked_ids = [i for i, (name, _, _) in enumerate(voices) if name in sidechain["tracks"]]
+    ducked = np.isin(events["voice"], ducked_ids)
+    return events[ducked], events[~ducked], settings
+
+
+def mix_events(events, voices, length, clip=True, sidechain=None):
+    """
+    Mix an event table into a float32 buffer.
+
+    The buffer starts out silent and only the notes in the table are added,
+    so empty steps and tracks cost nothing.
+
+    Parameters:
+    - events: Event table from schedule.compile_block().
+    - voices: Voice list from build_voices().
+    - length: Length of the buffer in samples; notes running past it are cut.
+    - clip: Clip the mix to the 16-bit range. Leave it off when the mix goes
+            through a master limiter (see dynamics.Limiter), which needs the peaks.
+    - sidechain: Optional dict with "tracks", the names of the tracks to duck,
+                 and the sidechain_gain() settings, e.g.
+                 {"tracks": ["saw"], "key": "kick", "depth_db": 6.0}.
+
+    Returns:
+    - float32 numpy array of `length` samples.
+    """
+    bus = np.zeros(length, dtype=np.float32)
+    if not sidechain:
+        span = _add_events(bus, events, voices)
+    else:
+        ducked, rest, settings = _split_sidechain(events, voices, sidechain)
+        ducked_start, ducked_stop = _add_events(bus, ducked, voices)
+        bus *= sidechain_gain(events, voices, length, **settings)
+        start, stop = _add_events(bus, rest, voices)
+        span = min(start, ducked_start), max(stop, ducked_stop)
+
+    if clip:
+        _clip(bus, span)
+    return bus
+
+
+def _add_stems(bus, stems, events, voices):
+    # Mix every voice of the events into a stem of its own, stored in stems,
+    # and sum the stems into bus in event order. Returns the span written to.
+    start, stop = len(bus), 0
+
+    for voice in dict.fromkeys(events["voice"].tolist()):
+        stem = np.zeros(len(bus), dtype=np.float32)
+        stem_start, stem_stop = _add_events(stem, events[events["voice"] == voice], voices)
+        if stem_stop > stem_start:
+            bus[stem_start:stem_stop] += stem[stem_start:stem_stop]
+            start, stop = min(start, stem_start), max(stop, stem_stop)
+        stems[voices[voice][0]] = stem
+
+    return start, stop
+
+
+def render_stems(events, voices, length, clip=True, sidechain=None):
+    """
+    Mix a block and keep every voice as a separate stem as well.
+
+    Each voice is mixed once into its own stem and the stems are summed into
+    the mix in event order, so the mix comes out exactly as mix_events() would
+    make it and nothing is rendered twice. Ducked stems are kept ducked.
+
+    Parameters:
+    - events, voices, length, clip, sidechain: As for mix_events(); clip only
+      applies to the mix.
+
+    Returns:
+    - (samples, stems) tuple, where stems is a dict of voice name -> float32 samples.
+      Voices that don't play in the block all share one read-only silent stem.
+    """
+    bus = np.zeros(length, dtype=np.float32)
+
+    silence = np.zeros(length, dtype=np.float32)
+    silence.flags.writeable = False
+    stems = {name: silence for name, _, _ in voices}
+
+    if not sidechain:
+        span = _add_stems(bus, stems, events, voices)
+    else:
+        # The ducked tracks go in first and are turned down together, as in mix_events()
+        ducked, rest, settings = _split_sidechain(events, voices, sidechain)
+        ducked_start, ducked_stop = _add_stems(bus, stems, ducked, voices)
+        gain = sidechain_gain(events, voices, length, **settings)
+        bus *= gain
+        for voice in dict.fromkeys(ducked["voice"].tolist()):
+            stems[voices[voice][0]] *= gain
+        start, stop = _add_stems(bus, stems, rest, voices)
+        span = min(start, ducked_start), max(stop, ducked_stop)
+
+    if clip:
+        _clip(bus, span)
+    return bus, stems
+
+
+# Parallel rendering
+# ------------------
+
+# Voice list, clip and sidechain settings of a worker process, handed over once when the process starts
+_worker_voices = None
+_worker_clip = True
+_worker_sidechain = None
+
+
+def _init_worker(voices, clip=True, sidechain=None):
+    global _worker_voices, _worker_clip, _worker_sidechain
+    _worker_voices = voices
+    _worker_clip = clip
+    _worker_sidechain = sidechain
+
+
+def _render_worker(job):
+    events, length = job
+    return mix_events(events, _worker_voices, length, _worker_clip, _worker_sidechain)
+
+
+def mix_parallel(jobs, voices, workers=None, clip=True, sidechain=None):
+    """
+    Mix several blocks at once in a pool of processes.
+
+    Blocks don't depend on each other once the voices exist, so each worker
+    gets the voice list once and then mixes whole blocks, sending back the
+    float32 buffers. The mixing itself is the same as mix_events(), so the
+    results are identical to mixing the blocks one by one. Lazy note tables
+    are prewarmed with the notes the jobs play and handed over as plain dicts.
+
+    Parameters:
+    - jobs: List of (events, length) pairs from schedule.compile_block().
+    - voices: Voice list from build_voices().
+    - workers: Number of processes, defaults to one per core.
+    - clip, sidechain: As for mix_events().
+
+    Returns:
+    - List of float32 buffers in the same order as jobs.
+    """
+    prewarm(voices, [events for events, _ in jobs])
+    voices = [(name, kind, dict(table)) for name, kind, table in voices]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(voices, clip, sidechain)) as pool:
+        return list(pool.map(_render_worker, jobs))
+
+
+def assemble(chunks, length):
+    """
+    Lay a stream of int16 chunks end to end in a single preallocated buffer.
+
+    The song's length is known before it is rendered, so the output is
+    allocated once and every chunk is copied into its slice as it arrives,
+    without keeping the chunks around or joining them at the end.
+
+    Parameters:
+    - chunks: Iterable of int16 numpy arrays, e.g. from stream.iter_chunks().
+    - length: Total number of samples in the chunks.
+
+    Returns:
+    - int16 numpy array of `length` samples.
+    """
+    song = np.empty(length, dtype=np.int16)
+    position = 0
+
+    for chunk in chunks:
+        end = position + len(chunk)
+        if end > length:
+            raise ValueError(f"the chunks run past the expected {length} samples")
+        song[position:end] = chunk
+        position = end
+
+    if position != length:
+        raise ValueError(f"expected {length} samples, got {position}")
+    return song
@@ -0,0 +1,244 @@
+import numpy as np
+
+# LFOs and modulation matrix
+# --------------------------
+#
+# Low frequency oscillators (sine, triangle, sample-and-hold) routed to a
+# sound's pitch, amplitude or filter cutoff. LFO buffers depend only on their
+# own settings and the length of the sound, so they are built once and shared,
+# read-only, by every note of an instrument and every instrument that uses the
+# same ones.
+#
+# Pitch modulation is integrated into the phase instead of being added to the
+# frequency inside sin(2 pi f t), which makes the pitch swing wider the longer
+# the note lasts. The integral doesn't depend on the note either: a note at
+# frequency f with its pitch scaled by r(t) has the phase f * sum(r) / sample_rate,
+# so one running sum serves a whole table of notes.
+
+# Where a route can go, and what its depth means there
+DESTINATIONS = {
+    "pitch": "semitones",
+    "frequency": "Hz",
+    "amp": "fraction of the level taken away at the bottom of the LFO",
+    "cutoff": "octaves",
+}
+
+# Built LFOs and matrices, the MAX_BUFFERS most recently used ones, oldest first
+MAX_BUFFERS = 64
+_buffers = {}
+
+
+def _memoized(key, build):
+    # Build once per key; arrays are handed out read-only since they are shared
+    if key in _buffers:
+        # Move it to the end, so the least recently used buffer is always first
+        _buffers[key] = _buffers.pop(key)
+        return _buffers[key]
+
+    value = build()
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    _buffers[key] = value
+    if len(_buffers) > MAX_BUFFERS:
+        del _buffers[next(iter(_buffers))]
+    return value
+
+
+def _sine(cycles, seed):
+    return np.sin(2 * np.pi * cycles)
+
+
+def _triangle(cycles, seed):
+    # Starts at 0 and rises, like the sine
+    return 1.0 - 4.0 * np.abs((cycles + 0.25) % 1.0 - 0.5)
+
+
+def _sample_and_hold(cycles, seed):
+    # A new random level at the start of every cycle, held until the next one
+    steps = np.floor(cycles).astype(np.int64)
+    steps -= steps[0] if len(steps) else 0
+    levels = np.random.default_rng(seed).uniform(-1.0, 1.0, (steps[-1] + 1) if len(steps) else 0)
+    return levels[steps]
+
+
+LFO_SHAPES = {
+    "sine": _sine,
+    "triangle": _triangle,
+    "sample_and_hold": _sample_and_hold,
+}
+
+
+def lfo(shape, rate, num_samples, sample_rate=44100, start=0.0, seed=0):
+    """
+    LFO buffer between -1 and 1.
+
+    Parameters:
+    - shape: "sine", "triangle" or "sample_and_hold".
+    - rate: Frequency in Hz (new levels per second for sample-and-hold).
+    - num_samples: Number of samples.
+    - sample_rate: Sample rate in Hz.
+    - start: Phase of the first sample in cycles.
+    - seed: int seed of the sample-and-hold levels.
+
+    Returns:
+    - Read-only float64 array, shared between calls.
+    """
+    key = ("lfo", shape, float(rate), num_samples, sample_rate, float(start), seed)
+    cycles = lambda: np.arange(num_samples) * (rate / sample_rate) + start
+    return _memoized(key, lambda: LFO_SHAPES[shape](cycles(), seed))
+
+
+def route(shape, rate, destination, depth, start=0.0, seed=0):
+    """
+    Describe one route of a modulation matrix: an LFO and where it goes.
+
+    Parameters:
+    - shape, rate, start, seed: The LFO, see lfo().
+    - destination: "pitch", "frequency", "amp" or "cutoff".
+    - depth: How far the LFO moves the destination, in the units of DESTINATIONS.
+
+    Returns:
+    - Tuple describing the route.
+    """
+    if destination not in DESTINATIONS:
+        raise KeyError(destination)
+    return (shape, float(rate), destination, float(depth), float(start), seed)
+
+
+class Modulation:
+    """
+    The routes of an instrument, summed per destination for a sound length.
+
+    Use matrix() to get one, so instruments with the same routes and length
+    share it. Every curve is worked out on first use and then kept.
+
+    Parameters:
+    - routes: Sequence of route() tuples.
+    - num_samples: Length of the sounds it modulates.
+    - sample_rate: Sample rate in Hz.
+    """
+
+    def __init__(self, routes, num_samples, sample_rate=44100):
+        self.routes = tuple(routes)
+        self.num_samples = num_samples
+        self.sample_rate = sample_rate
+        self._curves = {}
+
+    def curve(self, destination):
+        """Sum of depth * LFO over the routes to destination, or None when nothing goes there."""
+        if destination not in self._curves:
+            total = None
+            for shape, rate, to, depth, start, seed in self.routes:
+                if to == destination:
+                    buffer = depth * lfo(shape, rate, self.num_samples, self.sample_rate, start, seed)
+                    total = buffer if total is None else total + buffer
+            if total is not None:
+                total.flags.writeable = False
+            self._curves[destination] = total
+        return self._curves[destination]
+
+    def _running_sums(self):
+        # Phase of a 1 Hz note under the pitch routes, and the phase the
+        # frequency routes add to every note, both in cycles
+        if "sums" not in self._curves:
+            step = np.ones(self.num_samples)
+            if self.curve("pitch") is not None:
+                step = 2.0 ** (self.curve("pitch") / 12.0)
+            offset = self.curve("frequency")
+
+            ratio = np.zeros(self.num_samples)
+            np.cumsum(step[:-1] / self.sample_rate, out=ratio[1:])
+            added = None
+            if offset is not None:
+                added = np.zeros(self.num_samples)
+                np.cumsum(offset[:-1] / self.sample_rate, out=added[1:])
+            self._curves["sums"] = ratio, added
+        return self._curves["sums"]
+
+    def phase(self, frequency, start=0.0):
+        """
+        Phase of notes under the pitch and frequency routes, in cycles wrapped to [0, 1).
+
+        Parameters:
+        - frequency: Frequency of the note in Hz, or a (notes, 1) column of them.
+        - start: Phase of the first sample in cycles.
+
+        Returns:
+        - float64 numpy array of num_samples phases (notes x num_samples for a column).
+        """
+        ratio, added = self._running_sums()
+        cycles = np.asarray(frequency, dtype=np.float64) * ratio
+        if added is not None:
+            cycles += added
+        cycles += start
+        cycles -= np.floor(cycles)
+        return cycles
+
+    def frequency(self, frequency):
+        """
+        Per-sample frequency of notes under the pitch and frequency routes.
+
+        Pass it to the oscillators when they need the frequency rather than
+        the phase, e.g. for the band-limited saw.
+
+        Returns:
+        - float64 numpy array of num_samples frequencies (notes x num_samples for a column).
+        """
+        curve = np.asarray(frequency, dtype=np.float64) * np.ones(self.num_samples)
+        if self.curve("pitch") is not None:
+            curve *= 2.0 ** (self.curve("pitch") / 12.0)
+        if self.curve("frequency") is not None:
+            curve += self.curve("frequency")
+        return curve
+
+    def gain(self):
+        """Per-sample gain of the amp routes (tremolo), between 1 - depth and 1, or None."""
+        if "gain" not in self._curves:
+            depth = self.curve("amp")
+            gain = None
+            if depth is not None:
+                # Take the LFO from -1..1 to 0..1 and dip the level by depth at its bottom
+                amount = sum(abs(d) for _, _, to, d, _, _ in self.routes if to == "amp")
+                gain = 1.0 - (amount - depth) / 2.0
+                gain.flags.writeable = False
+            self._curves["gain"] = gain
+        return self._curves["gain"]
+
+    def apply_gain(self, samples):
+        """Multiply samples (1-D or one sound per row) by gain() in place and return them."""
+        gain = self.gain()
+        if gain is not None:
+            samples *= gain[:samples.shape[-1]]
+        return samples
+
+    def cutoff(self, base_cutoff):
+        """
+        Per-sample filter cutoff under the cutoff routes.
+
+        Parameters:
+        - base_cutoff: Cutoff in Hz with the LFOs at 0.
+
+        Returns:
+        - float64 numpy array of num_samples cutoffs, or base_cutoff when nothing goes there.
+        """
+        octaves = self.curve("cutoff")
+        if octaves is None:
+            return base_cutoff
+        return base_cutoff * 2.0 ** octaves
+
+
+def matrix(routes, num_samples, sample_rate=44100):
+    """
+    Shared Modulation for routes at a sound length.
+
+    Parameters:
+    - routes: Sequence of route() tuples.
+    - num_samples: Length of the sounds it modulates.
+    - sample_rate: Sample rate in Hz.
+
+    Returns:
+    - Modulation, shared by every call with the same arguments (while it stays memoized).
+    """
+    routes = tuple(routes)
+    return _memoized(("matrix", routes, num_samples, sample_rate),
+                     lambda: Modulation(routes, num_samples, sample_rate))
@@ -0,0 +1,113 @@
+import numpy as np
+
+from oscillators import to_segment
+
+# Seeded noise sources
+# --------------------
+#
+# White, pink and brown noise as whole numpy arrays, drawn from an explicitly
+# seeded np.random.Generator. The same seed always gives the same samples, so
+# renders that use noise are reproducible and can be cached, which pydub's
+# WhiteNoise (Python's global random, one sample at a time) never allowed.
+#
+# Every function takes a seed that is either an int or a Generator. Passing
+# a Generator draws from it, so several sounds can share one stream.
+
+
+def white_noise(num_samples, seed=0, distribution="uniform"):
+    """
+    White noise.
+
+    Parameters:
+    - num_samples: Number of samples.
+    - seed: int seed or np.random.Generator.
+    - distribution: "uniform" for values evenly spread between -1 and 1, like
+                    pydub's WhiteNoise, or "normal" for Gaussian noise with a
+                    standard deviation of 1.
+
+    Returns:
+    - float64 numpy array.
+    """
+    rng = np.random.default_rng(seed)
+    if distribution == "normal":
+        return rng.standard_normal(num_samples)
+    return rng.uniform(-1.0, 1.0, num_samples)
+
+
+def pink_noise(num_samples, seed=0, rows=16):
+    """
+    Pink (1/f) noise between -1 and 1, with the Voss-McCartney algorithm.
+
+    Row k of the generator holds a random value that is redrawn every 2**k
+    samples, staggered so only one row changes at a time, and the rows are
+    summed with a white row on top. Each row is built in one go: its values
+    are drawn up front and spread over the samples they hold for.
+
+    Parameters:
+    - num_samples: Number of samples.
+    - seed: int seed or np.random.Generator.
+    - rows: Number of rows; the spectrum is pink down to about sample_rate / 2**rows.
+
+    Returns:
+    - float64 numpy array.
+    """
+    rng = np.random.default_rng(seed)
+    position = np.arange(num_samples)
+    pink = rng.uniform(-1.0, 1.0, num_samples)
+
+    for row in range(rows):
+        # Row k is redrawn at samples whose lowest set bit is k, so this counts
+        # how many times it has been redrawn by each sample
+        draws = (position + (1 << row)) >> (row + 1)
+        values = rng.uniform(-1.0, 1.0, ((num_samples + (1 << row)) >> (row + 1)) + 1)
+        pink += values[draws]
+
+    pink /= rows + 1
+    return pink
+
+
+def brown_noise(num_samples, seed=0):
+    """
+    Brown (1/f^2) noise: a random walk of white noise, centred and scaled to peak at 1.
+
+    Parameters:
+    - num_samples: Number of samples.
+    - seed: int seed or np.random.Generator.
+
+    Returns:
+    - float64 numpy array.
+    """
+    brown = np.cumsum(white_noise(num_samples, seed))
+    if not num_samples:
+        return brown
+
+    brown -= brown.mean()
+    peak = np.abs(brown).max()
+    if peak:
+        brown /= peak
+    return brown
+
+
+NOISES = {
+    "white": white_noise,
+    "pink": pink_noise,
+    "brown": brown_noise,
+}
+
+
+def create_noise(color, duration_ms, seed=0, volume=0.0, sample_rate=44100):
+    """
+    Create a noise AudioSegment, a seeded drop-in for WhiteNoise().to_audio_segment().
+
+    Parameters:
+    - color: "white", "pink" or "brown".
+    - duration_ms: Length in milliseconds.
+    - seed: int seed or np.random.Generator.
+    - volume: Gain in dB, 0 for full scale.
+    - sample_rate: Sample rate in Hz.
+
+    Returns:
+    - 16-bit mono AudioSegment.
+    """
+    num_samples = int(sample_rate * duration_ms / 1000.0)
+    return to_segment(NOISES[color](num_samples, seed), sample_rate, volume)
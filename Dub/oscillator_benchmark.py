@@ -0,0 +1,23 @@
+import timeit
+
+from pydub.generators import Sawtooth, Sine, Square, Triangle
+
+from oscillators import create_wave
+
+# Compare the oscillator bank against pydub's generators
+# ------------------------------------------------------
+
+generators = {
+    "sine": Sine,
+    "saw": Sawtooth,
+    "square": Square,
+    "triangle": Triangle,
+}
+
+for waveform, generator in generators.items():
+    for duration_ms in [250, 1000]:
+        # Best of a few runs, to keep other load on the machine out of it
+        runs = 10
+        old = min(timeit.repeat(lambda: generator(523.25).to_audio_segment(duration=duration_ms), number=runs, repeat=5)) / runs
+        new = min(timeit.repeat(lambda: create_wave(waveform, 523.25, duration_ms), number=runs, repeat=5)) / runs
+        print(f"{waveform:>8} {duration_ms:5d} ms: pydub {old * 1000:7.2f} ms, oscillators {new * 1000:6.3f} ms, {old / new:5.0f}x faster")
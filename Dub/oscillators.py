@@ -0,0 +1,266 @@
+import numpy as np
+from pydub import AudioSegment
+from pydub.utils import db_to_float
+
+# Oscillator bank
+# ---------------
+#
+# Sine, saw, square and triangle waves rendered as whole numpy arrays, instead
+# of pydub's generators, which build every sample in a Python loop. The waves
+# line up with pydub's (same start phase, same polarity), but the saw and the
+# square get a PolyBLEP correction at each jump and the triangle a PolyBLAMP
+# one at each corner, so high notes don't fold harmonics back down into the
+# audible range the way the naive shapes do.
+
+
+def phase(frequency, num_samples, sample_rate=44100, start=0.0):
+    """
+    Phase of an oscillator in cycles, wrapped to [0, 1).
+
+    Parameters:
+    - frequency: Frequency in Hz, either a number or an array of one value per
+                 sample. A 2-D array renders one oscillator per row: a
+                 (notes, 1) column holds each row at a fixed pitch, a
+                 (notes, num_samples) array sweeps every row separately.
+    - num_samples: Number of samples to render.
+    - sample_rate: Sample rate in Hz.
+    - start: Phase of the first sample in cycles.
+
+    Returns:
+    - float64 numpy array of num_samples phases (notes x num_samples for a 2-D frequency).
+    """
+    if np.ndim(frequency) == 0:
+        cycles = np.arange(num_samples, dtype=np.float64)
+        cycles *= frequency / sample_rate
+    elif np.ndim(frequency) == 2 and np.shape(frequency)[1] == 1:
+        cycles = np.arange(num_samples, dtype=np.float64) * (np.asarray(frequency, dtype=np.float64) / sample_rate)
+    else:
+        # Integrate the frequency so the phase stays continuous as it moves
+        step = np.asarray(frequency, dtype=np.float64)[..., :num_samples] / sample_rate
+        cycles = np.zeros(step.shape)
+        np.cumsum(step[..., :-1], axis=-1, out=cycles[..., 1:])
+
+    if start:
+        cycles += start
+    cycles -= np.floor(cycles)
+    return cycles
+
+
+def _increment(frequency, num_samples, sample_rate):
+    # Phase advance per sample, clamped so the corrections stay inside one cycle
+    if np.ndim(frequency) == 0:
+        return min(max(abs(frequency) / sample_rate, 1e-9), 0.5)
+    step = np.abs(np.asarray(frequency, dtype=np.float64)[..., :num_samples]) / sample_rate
+    return np.clip(step, 1e-9, 0.5)
+
+
+def _blep(x):
+    # PolyBLEP residual for a step of +1, x samples after it (|x| < 1)
+    return np.copysign(0.5 * (1.0 - np.abs(x)) ** 2, -x)
+
+
+def _blamp(x, dt):
+    # PolyBLAMP residual for a change of slope of +1 per cycle, x samples after it (|x| < 1)
+    return (1.0 - np.abs(x)) ** 3 * (dt / 6.0)
+
+
+def _distance(t, dt):
+    # Signed distance from phase 0 in samples, negative just before it
+    return (t - (t >= 0.5)) / dt
+
+
+def poly_blep(t, dt):
+    """
+    PolyBLEP residual for a unit step at phase 0.
+
+    Parameters:
+    - t: Phase in cycles, wrapped to [0, 1).
+    - dt: Phase advance per sample (a number or an array like t).
+
+    Returns:
+    - The correction to add to a naive wave for a jump of +1 at every wrap
+      (scale it by the real height of the jump). It is zero more than one
+      sample away from the jump.
+    """
+    x = _distance(t, dt)
+    return np.where(np.abs(x) < 1.0, _blep(x), 0.0)
+
+
+def poly_blamp(t, dt):
+    """
+    PolyBLAMP residual for a unit change of slope at phase 0.
+
+    Parameters:
+    - t, dt: As for poly_blep().
+
+    Returns:
+    - The correction to add to a naive wave whose slope jumps by +1 per cycle
+      at every wrap (scale it by the real change of slope).
+    """
+    x = _distance(t, dt)
+    return np.where(np.abs(x) < 1.0, _blamp(x, dt), 0.0)
+
+
+def _correct(wave, t, dt, jumps, blamp=False):
+    # Add the BLEP (or BLAMP) residuals of every jump to the samples of wave
+    # within a sample of it, leaving the rest of the wave alone. jumps is a
+    # list of (at, amount) pairs: the phase the jump happens at and its size.
+    # All the jumps are found and corrected together, in one pass.
+    length = t.shape[-1]
+    if not length:
+        return
+
+    flat_t, flat_wave = t.reshape(-1), wave.reshape(-1)
+    at = np.array([position for position, _ in jumps])
+    amount = np.array([size for _, size in jumps])
+
+    if np.ndim(dt) == 0 or np.shape(dt)[-1] == 1:
+        # At a fixed pitch (per row) the crossings are evenly spaced, so
+        # where they fall, in samples, is counted out rather than searched
+        # for, and so are the samples either side of them: rows x jumps x
+        # crossings, starting with the one before the first sample
+        rows = flat_t.size // length
+        if np.ndim(dt) == 0:
+            row_dt = fastest = dt
+        else:
+            row_dt = np.reshape(dt, (-1, 1, 1)) * np.ones((rows, 1, 1))
+            fastest = row_dt.max()
+        period = 1.0 / row_dt
+        count = int(np.ceil(length * fastest)) + 2
+
+        crossing = ((at - t.reshape(rows, length)[:, :1]) % 1.0)[:, :, None] * period
+        crossing = crossing + np.arange(-1, count - 1) * period
+        crossing = np.concatenate((crossing, crossing), axis=2)
+        column = np.ceil(crossing)
+        column[..., :count] -= 1.0
+        x = column - crossing
+
+        # Work out every residual, then keep the ones that land in the wave
+        inside = (column >= 0) & (column < length)
+        near = (column + np.arange(0, flat_t.size, length)[:, None, None])[inside].astype(np.int64)
+        residual = (amount[:, None] * (_blamp(x, row_dt) if blamp else _blep(x)))[inside]
+    else:
+        flat_dt = np.broadcast_to(dt, t.shape).reshape(-1)
+        found = [np.flatnonzero(np.abs((flat_t - position + 0.5) % 1.0 - 0.5) < flat_dt) for position in at]
+        near = np.concatenate(found)
+        step = flat_dt[near]
+        jump = np.repeat(np.arange(len(at)), [len(indices) for indices in found])
+
+        local = flat_t[near] - at[jump]
+        local -= np.floor(local)
+        x = _distance(local, step)
+        residual = amount[jump] * (_blamp(x, step) if blamp else _blep(x))
+        fastest = step.max() if len(step) else 0.0
+
+    if len(jumps) > 1 and fastest > 0.25:
+        # Above a quarter of the sample rate, jumps half a cycle apart can
+        # share a sample, and only np.add.at adds up repeated indices
+        np.add.at(flat_wave, near, residual)
+    else:
+        flat_wave[near] += residual
+
+
+def sine(frequency, num_samples, sample_rate=44100, start=0.0):
+    """Sine wave between -1 and 1; takes the same parameters as phase()."""
+    # The phase is kept in float64, float32 is plenty for the sine itself
+    angle = (phase(frequency, num_samples, sample_rate, start) * (2 * np.pi)).astype(np.float32)
+    return np.sin(angle, out=angle)
+
+
+def sawtooth(frequency, num_samples, sample_rate=44100, start=0.0):
+    """Band-limited rising sawtooth between -1 and 1; takes the same parameters as phase()."""
+    t = phase(frequency, num_samples, sample_rate, start)
+    dt = _increment(frequency, num_samples, sample_rate)
+
+    wave = t.astype(np.float32)
+    wave *= 2.0
+    wave -= 1.0
+    # The ramp drops by 2 at every wrap
+    _correct(wave, t, dt, [(0.0, -2.0)])
+    return wave
+
+
+def square(frequency, num_samples, sample_rate=44100, start=0.0):
+    """Band-limited square wave, high for the first half of the cycle; takes the same parameters as phase()."""
+    t = phase(frequency, num_samples, sample_rate, start)
+    dt = _increment(frequency, num_samples, sample_rate)
+
+    wave = (t < 0.5).astype(np.float32)
+    wave *= 2.0
+    wave -= 1.0
+    # Up by 2 at the wrap, down by 2 half way through
+    _correct(wave, t, dt, [(0.0, 2.0), (0.5, -2.0)])
+    return wave
+
+
+def triangle(frequency, num_samples, sample_rate=44100, start=0.0):
+    """Band-limited triangle wave, rising from -1 for the first half of the cycle; takes the same parameters as phase()."""
+    t = phase(frequency, num_samples, sample_rate, start)
+    dt = _increment(frequency, num_samples, sample_rate)
+
+    wave = (t - 0.5).astype(np.float32)
+    np.abs(wave, out=wave)
+    wave *= -4.0
+    wave += 1.0
+    # The slope flips from -4 to +4 per cycle at the wrap and back half way through
+    _correct(wave, t, dt, [(0.0, 8.0), (0.5, -8.0)], blamp=True)
+    return wave
+
+
+WAVEFORMS = {
+    "sine": sine,
+    "saw": sawtooth,
+    "square": square,
+    "triangle": triangle,
+}
+
+
+def to_pcm(samples, volume=0.0):
+    """
+    Quantize float samples between -1 and 1 to int16 the way pydub's generators do.
+
+    Parameters:
+    - samples: Float numpy array of any shape.
+    - volume: Gain in dB, 0 for full scale. Anything pushed past full scale is clipped.
+
+    Returns:
+    - int16 numpy array of the same shape.
+    """
+    pcm = samples * np.float32(32767 * db_to_float(volume))
+    np.clip(pcm, -32768, 32767, out=pcm)
+    return pcm.astype(np.int16)
+
+
+def to_segment(samples, sample_rate=44100, volume=0.0):
+    """
+    Convert float samples between -1 and 1 to a 16-bit mono AudioSegment.
+
+    Scales the same way pydub's generators do (see to_pcm()), so a wave made
+    here is a drop-in for the matching to_audio_segment() call.
+
+    Parameters:
+    - samples: 1-D float numpy array.
+    - sample_rate: Sample rate in Hz.
+    - volume: Gain in dB, 0 for full scale.
+    """
+    pcm = to_pcm(samples, volume)
+    return AudioSegment(pcm.tobytes(), frame_rate=sample_rate, sample_width=2, channels=1)
+
+
+def create_wave(waveform, frequency, duration_ms, volume=0.0, sample_rate=44100):
+    """
+    Create an oscillator AudioSegment.
+
+    Parameters:
+    - waveform: "sine", "saw", "square" or "triangle".
+    - frequency: Frequency in Hz.
+    - duration_ms: Length in milliseconds.
+    - volume: Gain in dB, 0 for full scale.
+    - sample_rate: Sample rate in Hz.
+
+    Returns:
+    - 16-bit mono AudioSegment, the same length as pydub's generators make it.
+    """
+    num_samples = int(sample_rate * duration_ms / 1000.0)
+    samples = WAVEFORMS[waveform](frequency, num_samples, sample_rate)
+    return to_segment(samples, sample_rate, volume)
@@ -0,0 +1,151 @@
+import numpy as np
+from pydub import AudioSegment
+
+from envelope import decay
+from filters import lowpass, sweep
+from noise import white_noise
+
+# Convolution reverb
+# ------------------
+#
+# Reverb by convolving a send bus with an impulse response, either recorded
+# (a WAV file) or synthetic (decaying noise that gets darker as it dies away).
+# The convolution is uniformly partitioned overlap-add: the impulse response
+# is cut into blocks, each one FFT'd once up front, and every block of input
+# is FFT'd once and multiplied with all of them in the frequency domain. That
+# makes a few seconds of tail cost a handful of array operations per block
+# instead of an overlay per sample.
+#
+# Reverb is a stream, like the master limiter: it keeps its state from one
+# call to the next, so tails carry on across section boundaries, and it adds
+# no delay, whatever size the pieces it is given.
+
+# Samples per partition; the FFTs are twice this
+BLOCK_SIZE = 4096
+
+
+def _unit_energy(impulse):
+    # Scale an impulse response to a total energy of 1, so the wet level
+    # doesn't depend on how long or loud it is
+    energy = np.sqrt(np.sum(np.square(impulse, dtype=np.float64)))
+    return (impulse / energy if energy else impulse).astype(np.float32)
+
+
+def synthetic_ir(rt60=2.5, predelay_ms=10.0, bright=10000.0, dark=1500.0, sample_rate=44100, seed=0):
+    """
+    Synthetic impulse response: exponentially decaying noise, darker as it decays.
+
+    Parameters:
+    - rt60: Time for the tail to die away by 60dB, in seconds; it is also the length.
+    - predelay_ms: Silence before the tail starts.
+    - bright: Low pass cutoff at the start of the tail, in Hz.
+    - dark: Low pass cutoff at the end of the tail, in Hz.
+    - sample_rate: Sample rate in Hz.
+    - seed: int seed of the noise.
+
+    Returns:
+    - float32 numpy array with a total energy of 1.
+    """
+    predelay = int(predelay_ms * sample_rate / 1000.0)
+    length = int(rt60 * sample_rate)
+
+    # -60dB over rt60 seconds is a time constant of rt60 / ln(1000)
+    tail = white_noise(length, seed, "normal") * decay(rt60 / np.log(1000.0), length, sample_rate)
+
+    # High frequencies die away first: sweep a low pass from bright down to dark
+    cutoff = bright * (dark / bright) ** (np.arange(length) / max(length, 1))
+    tail = sweep(tail, lowpass, cutoff, sample_rate=sample_rate)
+
+    return _unit_energy(np.concatenate((np.zeros(predelay), tail)))
+
+
+def load_ir(path, sample_rate=44100):
+    """
+    Load an impulse response from a WAV file.
+
+    Parameters:
+    - path: Path of the WAV file; stereo files are mixed down to mono.
+    - sample_rate: Sample rate to bring it to.
+
+    Returns:
+    - float32 numpy array with a total energy of 1.
+    """
+    segment = AudioSegment.from_wav(path).set_channels(1).set_frame_rate(sample_rate)
+    return _unit_energy(np.array(segment.get_array_of_samples(), dtype=np.float64))
+
+
+class Reverb:
+    """
+    Streaming convolution of a send bus with an impulse response.
+
+    Parameters:
+    - impulse: Impulse response, e.g. from synthetic_ir() or load_ir().
+    - block_size: Samples per partition. Bigger blocks are faster on long
+                  tails but recompute more when fed small pieces.
+    """
+
+    def __init__(self, impulse, block_size=BLOCK_SIZE):
+        self.block_size = block_size
+        self.length = len(impulse)
+
+        # The impulse response in partitions of block_size, each FFT'd once
+        partitions = max(-(-len(impulse) // block_size), 1)
+        padded = np.zeros(partitions * block_size)
+        padded[:len(impulse)] = impulse
+        self._spectra = np.fft.rfft(padded.reshape(partitions, block_size), n=2 * block_size, axis=1)
+
+        # Spectra of the last partitions - 1 input blocks, in a ring that is
+        # stored twice over so the newest-first run is always one slice, and
+        # what the current block adds to the next one
+        self._ring = np.zeros((2 * (partitions - 1), block_size + 1), dtype=complex)
+        self._newest = 0
+        self._overlap = np.zeros(block_size)
+
+        # The block being filled, and the earlier blocks' share of its output
+        self._block = np.zeros(0)
+        self._earlier = None
+
+    def __call__(self, samples):
+        """
+        Convolve the next piece of the stream.
+
+        Parameters:
+        - samples: 1-D float numpy array, any length.
+
+        Returns:
+        - float32 numpy array of the wet signal, as long as samples and in time with it.
+        """
+        samples = np.asarray(samples, dtype=np.float64)
+        out = []
+
+        while len(samples):
+            take = min(self.block_size - len(self._block), len(samples))
+            self._block = np.concatenate((self._block, samples[:take]))
+            samples = samples[take:]
+
+            if self._earlier is None:
+                # The earlier blocks' part doesn't change while this one fills up
+                history = self._ring[self._newest:self._newest + len(self._spectra) - 1]
+                self._earlier = np.einsum("pk,pk->k", history, self._spectra[1:])
+
+            # A block that isn't full yet is convolved as if the rest were silent,
+            # which is exact for the samples it has so far; it's redone as it fills
+            spectrum = np.fft.rfft(self._block, n=2 * self.block_size)
+            wet = np.fft.irfft(spectrum * self._spectra[0] + self._earlier, n=2 * self.block_size)
+            filled = len(self._block)
+            out.append(wet[filled - take:filled] + self._overlap[filled - take:filled])
+
+            if filled == self.block_size:
+                self._overlap = wet[self.block_size:]
+                size = len(self._spectra) - 1
+                if size:
+                    self._newest = (self._newest - 1) % size
+                    self._ring[self._newest] = self._ring[self._newest + size] = spectrum
+                self._block = np.zeros(0)
+                self._earlier = None
+
+        return np.concatenate(out).astype(np.float32) if out else np.zeros(0, dtype=np.float32)
+
+    def tail(self):
+        """Let the reverb ring out: the len(impulse) - 1 samples after the end of the input."""
+        return self(np.zeros(self.length - 1))
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+# Sample cache on disk
+# --------------------
+#
+# Synthesized sounds are stored as .npy files named after a hash of everything
+# that went into them, so an unchanged sound is never synthesized twice, not
+# even across runs. Files are memory-mapped when they are loaded, so a cached
+# table costs no memory until it is played. The cache has a size cap: when it
+# grows past it, the files used least recently are deleted first.
+
+# Default cache folder, can be moved with the AIMUSIC_CACHE environment variable
+CACHE_DIR = os.environ.get("AIMUSIC_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "aimusic", "samples"))
+
+# Default size cap in bytes
+MAX_BYTES = 512 * 1024 * 1024
+
+# Part of every key; bump it when synthesis changes in a way the parameters don't show
+CACHE_VERSION = 1
+
+
+def cache_key(name, **params):
+    """
+    Hash a sound's name and parameters into a cache key.
+
+    Parameters:
+    - name: Name of the synth function or instrument.
+    - params: Everything the sound depends on: frequency, duration, envelope,
+              effects chain, seed, sample rate... Values must be JSON-able
+              (numbers, strings, lists, dicts, None).
+
+    Returns:
+    - Hex digest string.
+    """
+    description = json.dumps([CACHE_VERSION, name, params], sort_keys=True, default=repr)
+    return hashlib.sha256(description.encode()).hexdigest()
+
+
+class SampleCache:
+    """
+    Content-addressed store of synthesized samples.
+
+    Parameters:
+    - directory: Folder for the .npy files, created when needed.
+    - max_bytes: Size cap; the least recently used files are evicted past it.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".npy")
+
+    def load(self, key):
+        """Return the cached samples for key as a read-only memory map, or None."""
+        path = self.path(key)
+        try:
+            samples = np.load(path, mmap_mode="r")
+
+            # The modification time doubles as the last use, for eviction. A
+            # read-only cache, or a file evicted in the meantime, is a miss.
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+
+        return samples
+
+    def store(self, key, samples):
+        """
+        Write samples to the cache under key, then evict down to the size cap.
+
+        The file is written under a temporary name and renamed into place, so
+        a run that is interrupted, or another one reading at the same time,
+        never sees half a file.
+
+        A cache that can't be written to (a read-only folder, a full disk...)
+        is not an error: the samples are just returned without being stored.
+
+        Returns:
+        - samples, unchanged.
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        except OSError:
+            return samples
+
+        try:
+            with os.fdopen(handle, "wb") as file:
+                np.save(file, np.ascontiguousarray(samples))
+            os.replace(temp_path, self.path(key))
+        except OSError:
+            return samples
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+        try:
+            self.evict()
+        except OSError:
+            pass
+        return samples
+
+    def evict(self):
+        """Delete the least recently used files until the cache fits in max_bytes."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".npy"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def sound(self, name, create, **params):
+        """
+        Load a sound from the cache, or synthesize and store it.
+
+        The parameters that key the sound are the ones it is made with, so
+        the key can't leave out anything create() depends on.
+
+        Parameters:
+        - name, params: Describe the sound, see cache_key().
+        - create: Function returning the samples as a numpy array; it is called as create(**params).
+
+        Returns:
+        - numpy array (a read-only memory map when it came from the cache).
+        """
+        key = cache_key(name, **params)
+        samples = self.load(key)
+        return self.store(key, create(**params)) if samples is None else samples
+
+    def notes(self, name, synthesize, **params):
+        """
+        Wrap a note table's synthesize function so its notes go through the cache.
+
+        Parameters:
+        - name, params: Describe the instrument, see cache_key(); every note is
+                        keyed by these plus its note index.
+        - synthesize: Function taking a list of note indices and returning their
+                      samples in order, as for wavetable.LazyNoteTable.
+
+        Returns:
+        - Function with the same signature that only synthesizes the notes that
+          aren't cached yet, still in a single batch.
+        """
+        def cached(notes):
+            keys = [cache_key(name, note=note, **params) for note in notes]
+            found = [self.load(key) for key in keys]
+
+            missing = [i for i, samples in enumerate(found) if samples is None]
+            if missing:
+                for i, samples in zip(missing, synthesize([notes[i] for i in missing])):
+                    found[i] = self.store(keys[i], samples)
+
+            return found
+
+        return cached
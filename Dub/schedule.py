@@ -0,0 +1,102 @@
+import numpy as np
+
+# Pattern compiler
+# ----------------
+#
+# Turns the sequencer's block dicts into a compact table of events on a
+# sample-accurate tempo grid. Onsets are worked out from the step index and the
+# BPM in samples, not by adding up whole-millisecond steps, so nothing drifts
+# whatever the tempo. The mixer plays the table directly.
+
+# One row per note that actually plays
+EVENT_DTYPE = np.dtype([
+    ("onset", np.int64),   # sample offset from the start of the block
+    ("voice", np.int16),   # index of the instrument in the voice list
+    ("note", np.int16),    # entry in the instrument's note table (1 for drums)
+    ("gain", np.float32),  # linear gain taken from the track's level
+])
+
+# Compiled schedules, the MAX_COMPILED most recently used ones, oldest first
+MAX_COMPILED = 256
+_compiled = {}
+
+
+def step_frames(bpm, steps_per_bar=8, frame_rate=44100, beats_per_bar=4):
+    """Exact (fractional) number of samples in one step."""
+    return frame_rate * 60.0 * beats_per_bar / (bpm * steps_per_bar)
+
+
+def block_frames(steps, bpm, steps_per_bar=8, frame_rate=44100, beats_per_bar=4):
+    """Number of samples in a block of `steps` steps, rounded to the nearest sample."""
+    return int(round(steps * step_frames(bpm, steps_per_bar, frame_rate, beats_per_bar)))
+
+
+def section_key(sound_block, levels, bpm, steps_per_bar=8):
+    """
+    Build a hashable key describing everything a rendered block depends on.
+
+    Two blocks with the same patterns, the same levels for those tracks and
+    the same tempo mix to the same samples, so they can share one render.
+
+    Parameters:
+    - sound_block: Dict of track name -> list of steps.
+    - levels: Dict of track name -> attenuation in dB.
+    - bpm: Tempo in beats per minute.
+    - steps_per_bar: Number of steps in a bar of 4 beats.
+    """
+    tracks = tuple((name, tuple(pattern), levels[name]) for name, pattern in sound_block.items())
+    return tracks, bpm, steps_per_bar
+
+
+def compile_block(sound_block, voices, levels, bpm, steps_per_bar=8, frame_rate=44100):
+    """
+    Compile a block into an event table.
+
+    Drums play on a 1, notes on any non-zero note table index. Compiled tables
+    are cached, so compiling the same block at the same tempo again is free.
+
+    Parameters:
+    - sound_block: Dict of track name -> list of steps (0 is a rest).
+    - voices: List of (name, kind, note_table) as returned by mixer.build_voices().
+    - levels: Dict of track name -> attenuation in dB.
+    - bpm: Tempo in beats per minute.
+    - steps_per_bar: Number of steps in a bar of 4 beats.
+    - frame_rate: Sample rate the onsets are counted in.
+
+    Returns:
+    - (events, length) tuple: a read-only EVENT_DTYPE array sorted by track,
+      then onset, and the length of the block in samples.
+    """
+    layout = tuple((name, kind) for name, kind, _ in voices)
+    key = (section_key(sound_block, levels, bpm, steps_per_bar), layout, frame_rate)
+    if key in _compiled:
+        # Move it to the end, so the least recently used schedule is always first
+        _compiled[key] = _compiled.pop(key)
+        return _compiled[key]
+
+    voice_ids = {name: i for i, (name, _) in enumerate(layout)}
+    step = step_frames(bpm, steps_per_bar, frame_rate)
+    tables = []
+
+    for sound_name, pattern in sound_block.items():
+        voice = voice_ids[sound_name]
+        steps = np.asarray(pattern)
+        active = np.flatnonzero(steps == 1 if layout[voice][1] == "drum" else steps != 0)
+
+        table = np.empty(len(active), dtype=EVENT_DTYPE)
+        table["onset"] = np.rint(active * step)
+        table["voice"] = voice
+        table["note"] = steps[active]
+        table["gain"] = 10 ** (-levels[sound_name] / 20.0)
+        tables.append(table)
+
+    events = np.concatenate(tables) if tables else np.empty(0, dtype=EVENT_DTYPE)
+    events.flags.writeable = False
+
+    steps = max((len(pattern) for pattern in sound_block.values()), default=0)
+    length = block_frames(steps, bpm, steps_per_bar, frame_rate)
+
+    _compiled[key] = events, length
+    if len(_compiled) > MAX_COMPILED:
+        del _compiled[next(iter(_compiled))]
+    return events, length
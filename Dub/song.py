@@ -1,8 +1,11 @@
 import os
 from pydub import AudioSegment
-from pydub.generators import Sawtooth, Sine, WhiteNoise
 from pydub.playback import play
 
+from kick import create_kick
+from noise import create_noise
+from oscillators import create_wave
+
 # Setup sound parameters
 # -----------------------
 
@@ -23,41 +26,13 @@ def create_kick_drum(duration_ms):
     """
     Create a simple kick drum sound.
     """
-    # Initial and final frequencies for our kick drum sound
-    start_frequency = 150.0 / 2.0  # Start from a higher frequency
-    end_frequency = 50.0 / 2.0     # Drop to a lower frequency
-
-    # Create the attack (click) component using white noise
-    click_duration = int(duration_ms * 0.05)  # 5% of total duration
-    click = WhiteNoise().to_audio_segment(duration=click_duration)
-    click = click - 10  # Reduce the volume for the click
-
-    # Generate the initial sine wave at the start frequency
-    sine_kick = Sine(start_frequency).to_audio_segment(duration=duration_ms)
-
-    # Create a frequency sweep (pitch envelope) from the start to end frequency
-    for i in range(duration_ms):
-        # Calculate frequency drop ratio
-        ratio = i / duration_ms
-        frequency = start_frequency + ratio * (end_frequency - start_frequency)
-
-        # Overlay the sine wave segment with the adjusted frequency
-        sine_segment = Sine(frequency).to_audio_segment(duration=1)  # 1ms segment
-        sine_kick = sine_kick.overlay(sine_segment, position=i)
-
-    # Combine the click and sine_kick
-    combined_kick = click.overlay(sine_kick)
-
-    # Reduce the amplitude of the kick body to 60% 
-    reduced_kick = combined_kick - 4.44  # This is an approximation for 60% amplitude
-
-    # The generated sound might be a bit quiet, so let's increase its volume (amplify it)
-    amplified_kick = reduced_kick + 6  # Increase volume by 6dB, adjust as needed
-
-    return amplified_kick
+    # Sweep from 75 Hz down to 25 Hz under a white noise click (5% of the kick, -10dB),
+    # then take it down about 4.44dB (60% amplitude) and back up 6dB
+    return create_kick(duration_ms, start_frequency=150.0 / 2.0, end_frequency=50.0 / 2.0,
+                       click="noise", click_length=0.05, click_db=-10, gain_db=6 - 4.44)
 
 
-def create_snare_drum(duration_ms):
+def create_snare_drum(duration_ms, seed=2):
     """
     Create a synthetic snare drum sound.
     """
@@ -75,10 +50,10 @@ def create_snare_drum(duration_ms):
     # ------------------------------------
 
     # Generate the noise segment for the snare
-    noise_segment = WhiteNoise().to_audio_segment(duration=noise_duration)
+    noise_segment = create_noise("white", noise_duration, seed)
 
     # Generate the tonal "body" of the snare using a sine wave
-    body_segment = Sine(body_frequency).to_audio_segment(duration=duration_ms * 0.6)
+    body_segment = create_wave("sine", body_frequency, duration_ms * 0.6)
 
     # Adjust volumes to make noise more prominent and the body less so (adjust as needed)
     amplified_noise = noise_segment + 5  # Amplify the noise by 5dB
@@ -96,21 +71,19 @@ def create_snare_drum(duration_ms):
 
     return amplified_snare
 
-def create_white_noise(duration_ms):
-    """Create a white noise audio segment."""
-    noise = WhiteNoise().to_audio_segment(duration=duration_ms)
+def create_white_noise(duration_ms, seed=3):
+    """Create a white noise audio segment, the same for the same seed."""
+    noise = create_noise("white", duration_ms, seed)
     return noise
 
 def create_sawtooth_wave(frequency, duration_ms):
     """Create a sawtooth wave audio segment."""
-    sawtooth_wave = Sawtooth(frequency)
-    sawtooth_audio = sawtooth_wave.to_audio_segment(duration=duration_ms)
+    sawtooth_audio = create_wave("saw", frequency, duration_ms)
     return sawtooth_audio
 
 def create_sine_wave(frequency, duration_ms):
     """Create a sine wave audio segment."""
-    sine_wave = Sine(frequency)
-    sine_audio = sine_wave.to_audio_segment(duration=duration_ms)
+    sine_audio = create_wave("sine", frequency, duration_ms)
     return sine_audio
 
 # Creating sound segments
@@ -1,9 +1,13 @@
 import os
 from pydub import AudioSegment
 import numpy as np
-from pydub.generators import Sawtooth, Sine, WhiteNoise
 from pydub.playback import play
 
+from kick import create_kick
+from noise import create_noise
+from oscillators import create_wave
+from wavetable import chromatic_frequencies, note_segments, note_table
+
 # Setup sound parameters
 # -----------------------
 
@@ -26,38 +30,12 @@ def create_kick_drum(duration_ms):
     """
     Create a simple kick drum sound.
     """
-    # Initial and final frequencies for our kick drum sound
-    start_frequency = 150.0 / 2.0  # Start from a higher frequency
-    end_frequency = 50.0 / 2.0     # Drop to a lower frequency
-
-    # Create the attack (click) component using white noise
-    click_duration = int(duration_ms * 0.05)  # 5% of total duration
-    click = WhiteNoise().to_audio_segment(duration=click_duration)
-    click = click - 25  # Reduce the volume for the click
-
-    # Generate the initial sine wave at the start frequency
-    sine_kick = Sine(start_frequency).to_audio_segment(duration=duration_ms)
-
-    # Create a frequency sweep (pitch envelope) from the start to end frequency
-    for i in range(duration_ms):
-        # Calculate frequency drop ratio
-        ratio = i / duration_ms
-        frequency = start_frequency + ratio * (end_frequency - start_frequency)
-
-        # Overlay the sine wave segment with the adjusted frequency
-        sine_segment = Sine(frequency // 4.0).to_audio_segment(duration=0.05)  # 1ms segment
-        sine_kick = sine_kick.overlay(sine_segment, position=i)
-
-    # Combine the click and sine_kick
-    combined_kick = click.overlay(sine_kick)
+    # Sweep from 75 Hz down to 25 Hz with a white noise click (5% of the kick, -25dB), then 6dB louder
+    return create_kick(duration_ms, start_frequency=150.0 / 2.0, end_frequency=50.0 / 2.0,
+                       click="noise", click_length=0.05, click_db=-25, gain_db=6)
 
-    # The generated sound might be a bit quiet, so let's increase its volume (amplify it)
-    amplified_kick = combined_kick + 6  # Increase volume by 6dB, adjust as needed
 
-    return amplified_kick
-
-
-def create_snare_drum(duration_ms):
+def create_snare_drum(duration_ms, seed=2):
     """
     Create a synthetic snare drum sound.
     """
@@ -75,10 +53,10 @@ def create_snare_drum(duration_ms):
     # ------------------------------------
 
     # Generate the noise segment for the snare
-    noise_segment = WhiteNoise().to_audio_segment(duration=noise_duration)
+    noise_segment = create_noise("white", noise_duration, seed)
 
     # Generate the tonal "body" of the snare using a sine wave
-    body_segment = Sine(body_frequency).to_audio_segment(duration=duration_ms * 0.4)
+    body_segment = create_wave("sine", body_frequency, duration_ms * 0.4)
 
     # Adjust volumes to make noise more prominent and the body less so (adjust as needed)
     amplified_noise = noise_segment + 5  # Amplify the noise by 5dB
@@ -96,15 +74,14 @@ def create_snare_drum(duration_ms):
 
     return amplified_snare
 
-def create_white_noise(duration_ms):
-    """Create a white noise audio segment."""
-    noise = WhiteNoise().to_audio_segment(duration=duration_ms)
+def create_white_noise(duration_ms, seed=3):
+    """Create a white noise audio segment, the same for the same seed."""
+    noise = create_noise("white", duration_ms, seed)
     return noise
 
 def create_sawtooth_wave(frequency, duration_ms):
     """Create a sawtooth wave audio segment."""
-    sawtooth_wave = Sawtooth(frequency)
-    sawtooth_audio = sawtooth_wave.to_audio_segment(duration=duration_ms)
+    sawtooth_audio = create_wave("saw", frequency, duration_ms)
     return sawtooth_audio
 
 # def create_lead_synthesizer(frequency, duration_ms, vibrato_depth=0.5, vibrato_rate=6):
@@ -146,28 +123,26 @@ def create_sawtooth_wave(frequency, duration_ms):
 
 def create_lead(frequency, duration_ms):
     """Create a lead sound."""
-    sine_wave = Sine(frequency)
     # Amplifying the sine wave to get a stronger, more pronounced sound for the lead
-    sine_audio = sine_wave.to_audio_segment(duration=duration_ms).apply_gain(3)
+    sine_audio = create_wave("sine", frequency, duration_ms, volume=3)
     return sine_audio
 
 
 def create_lead_wave_table(base_frequency=261.63, duration_ms=1000):
-    """Create a lead wave table for 12 chromatic notes starting from the given base frequency."""
-
-    # Frequencies for 12-TET (Twelve-tone equal temperament) chromatic scale
-    # Using the formula: f_n = f_0 * (2^(1/12))^n
-    # where f_0 is the base frequency and n is the number of half steps.
+    """
+    Create a lead wave table for 12 chromatic notes starting from the given base frequency.
 
-    frequencies = [base_frequency * (2**(1/12))**i for i in range(12)]
+    All twelve notes are rendered together as one notes x samples array, each
+    row the same as create_lead() makes for that note.
+    """
 
-    note_names = ['c', 'c#', 'd', 'd#', 'e', 'f', 'f#', 'g', 'g#', 'a', 'a#', 'b']
+    # Frequencies for the 12-TET (Twelve-tone equal temperament) chromatic scale, one per row
+    frequencies = chromatic_frequencies(base_frequency, 12)
 
-    lead_wave_table = {}
-    for i, note in enumerate(note_names):
-        lead_wave_table[i+1] = create_lead(frequencies[i], duration_ms)
+    # The same +3 dB sine as create_lead()
+    table = note_table("sine", frequencies, duration_ms, volume=3)
 
-    return lead_wave_table
+    return note_segments(table)
 
 
 # Creating sound segments
@@ -1,9 +1,12 @@
 import os
 from pydub import AudioSegment
-import numpy as np
-from pydub.generators import Sawtooth, Sine, WhiteNoise
 from pydub.playback import play
 
+from kick import create_kick
+from noise import create_noise
+from oscillators import create_wave
+from wavetable import chromatic_frequencies, note_segments, note_table
+
 # Setup sound parameters
 # -----------------------
 
@@ -21,43 +24,12 @@ sine_frequency = 130.81  # Higher frequency for contrast
 # -----------------------------------------
 
 def create_kick_drum(duration_ms):
-    # For sine wave:
-    start_frequency = 150.0
-    end_frequency = 50.0
-    t = np.linspace(0, duration_ms / 1000.0, int(44100 * duration_ms / 1000.0))
-    phase_acc = np.cumsum((start_frequency + (end_frequency - start_frequency) * t / (duration_ms / 1000.0)) / 44100.0)
-    sine_wave = np.sin(2 * np.pi * phase_acc)
-
-    # Convert to audio segment
-    sine_wave_audio = (sine_wave * 32767).astype(np.int16)
-    empty_segment = AudioSegment.silent(duration=0)
-    sine_kick = empty_segment._spawn(sine_wave.tobytes()).set_frame_rate(44100).set_channels(1).set_sample_width(2)
-
-    # For the "click":
-    click_duration = int(duration_ms * 0.05)
-    click_frequency = 2000.0  # Higher frequency for the click
-    t_click = np.linspace(0, click_duration / 1000.0, int(44100 * click_duration / 1000.0))
-    click_wave = np.sin(2 * np.pi * click_frequency * t_click)
-
-    # Convert to audio segment
-    click_wave_audio = (click_wave * 32767).astype(np.int16)
-    click = empty_segment._spawn(click_wave_audio.tobytes()).set_frame_rate(44100).set_channels(1).set_sample_width(2)
-    click = click - 10  # Adjust volume if necessary
-
-    # Combine:
-    combined_kick = click.overlay(sine_kick)
-    
-    # Save for testing:
-    sine_kick.export("sine_test_simple.wav", format="wav")
-    click.export("click_test_simple.wav", format="wav")
-    combined_kick.export("combined_kick_test_simple.wav", format="wav")
-
-    return combined_kick
-
-#    return amplified_kick
-
-
-def create_snare_drum(duration_ms):
+    # Sweep from 150 Hz down to 50 Hz with a 2000 Hz sine click (5% of the kick, -10dB)
+    return create_kick(duration_ms, start_frequency=150.0, end_frequency=50.0,
+                       click=2000.0, click_length=0.05, click_db=-10, gain_db=0)
+
+
+def create_snare_drum(duration_ms, seed=2):
     """
     Create a synthetic snare drum sound.
     """
@@ -75,10 +47,10 @@ def create_snare_drum(duration_ms):
     # ------------------------------------
 
     # Generate the noise segment for the snare
-    noise_segment = WhiteNoise().to_audio_segment(duration=noise_duration)
+    noise_segment = create_noise("white", noise_duration, seed)
 
     # Generate the tonal "body" of the snare using a sine wave
-    body_segment = Sine(body_frequency).to_audio_segment(duration=duration_ms * 0.4)
+    body_segment = create_wave("sine", body_frequency, duration_ms * 0.4)
 
     # Adjust volumes to make noise more prominent and the body less so (adjust as needed)
     amplified_noise = noise_segment + 5  # Amplify the noise by 5dB
@@ -96,15 +68,14 @@ def create_snare_drum(duration_ms):
 
     return amplified_snare
 
-def create_white_noise(duration_ms):
-    """Create a white noise audio segment."""
-    noise = WhiteNoise().to_audio_segment(duration=duration_ms)
+def create_white_noise(duration_ms, seed=3):
+    """Create a white noise audio segment, the same for the same seed."""
+    noise = create_noise("white", duration_ms, seed)
     return noise
 
 def create_sawtooth_wave(frequency, duration_ms):
     """Create a sawtooth wave audio segment."""
-    sawtooth_wave = Sawtooth(frequency)
-    sawtooth_audio = sawtooth_wave.to_audio_segment(duration=duration_ms)
+    sawtooth_audio = create_wave("saw", frequency, duration_ms)
     return sawtooth_audio
 
 # def create_lead_synthesizer(frequency, duration_ms, vibrato_depth=0.5, vibrato_rate=6):
@@ -146,28 +117,26 @@ def create_sawtooth_wave(frequency, duration_ms):
 
 def create_lead(frequency, duration_ms):
     """Create a lead sound."""
-    sine_wave = Sine(frequency)
     # Amplifying the sine wave to get a stronger, more pronounced sound for the lead
-    sine_audio = sine_wave.to_audio_segment(duration=duration_ms).apply_gain(3)
+    sine_audio = create_wave("sine", frequency, duration_ms, volume=3)
     return sine_audio
 
 
 def create_lead_wave_table(base_frequency=261.63, duration_ms=1000):
-    """Create a lead wave table for 12 chromatic notes starting from the given base frequency."""
-
-    # Frequencies for 12-TET (Twelve-tone equal temperament) chromatic scale
-    # Using the formula: f_n = f_0 * (2^(1/12))^n
-    # where f_0 is the base frequency and n is the number of half steps.
+    """
+    Create a lead wave table for 12 chromatic notes starting from the given base frequency.
 
-    frequencies = [base_frequency * (2**(1/12))**i for i in range(12)]
+    All twelve notes are rendered together as one notes x samples array, each
+    row the same as create_lead() makes for that note.
+    """
 
-    note_names = ['c', 'c#', 'd', 'd#', 'e', 'f', 'f#', 'g', 'g#', 'a', 'a#', 'b']
+    # Frequencies for the 12-TET (Twelve-tone equal temperament) chromatic scale, one per row
+    frequencies = chromatic_frequencies(base_frequency, 12)
 
-    lead_wave_table = {}
-    for i, note in enumerate(note_names):
-        lead_wave_table[i+1] = create_lead(frequencies[i], duration_ms)
+    # The same +3 dB sine as create_lead()
+    table = note_table("sine", frequencies, duration_ms, volume=3)
 
-    return lead_wave_table
+    return note_segments(table)
 
 # Creating sound segments
 # -----------------------
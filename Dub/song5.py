@@ -1,168 +1,153 @@
 import os
 from pydub import AudioSegment
-import math
 import numpy as np
-from pydub.generators import Sawtooth, Sine, WhiteNoise
 from pydub.playback import play
 
+from dynamics import Limiter
+from effects import Chain
+from export import export
+from kick import create_kick
+from mixer import (assemble, build_voices, mix_events, mix_parallel, mix_samples, prewarm, render_stems,
+                   segment_to_array, to_audio_segment)
+from modulation import matrix, route
+from noise import create_noise
+from oscillators import create_wave
+from reverb import Reverb, synthetic_ir
+from samplecache import SampleCache
+from schedule import compile_block, section_key
+from stream import CHUNK_FRAMES, WavWriter, iter_chunks
+from wavetable import LazyNoteTable, chromatic_frequencies, note_table
+
 # Setup sound parameters
 # -----------------------
 
 # Determine the full path for the temporary WAV file
 temp_wav_path = os.path.join(os.path.expanduser("~"), "Downloads", "temp_sound.wav")
 
+# Tempo in beats per minute, with each bar of 4 beats split into 8 steps
+bpm = 120
+steps_per_bar = 8
+
+# Sample rate everything is mixed at
+frame_rate = 44100
+
 # Duration of each sound in milliseconds (assuming 4 beats)
-sound_duration = 2000
+sound_duration = 4 * 60000 // bpm
 
 # Frequencies of the sawtooth and sine waves (440 Hz is A4 note)
 sawtooth_frequency = 130.81 / 2.0
 sine_frequency = 130.81  # Higher frequency for contrast
 
-# Functions to create different sound types
-# -----------------------------------------
+# Seeds of the noise in the kick's click, the snare and the noise track, so they come out the same every run
+kick_seed = 1
+snare_seed = 2
+noise_seed = 3
+reverb_seed = 4
 
-def create_kick_drum(duration_ms):
-    """
-    Create a simple kick drum sound.
-    """
-    # Initial and final frequencies for our kick drum sound
-    start_frequency = 150.0
-    end_frequency = 50.0
+# Synthesized sounds are kept on disk, so a second render skips synthesis
+sample_cache = SampleCache()
 
-    # Create the attack (click) component using white noise
-    click_duration = int(duration_ms * 0.05)  # 5% of total duration
-    click = WhiteNoise().to_audio_segment(duration=click_duration)
-    click = click - 30  # Reduce the volume for the click
+# Master bus limiter: sections are mixed with headroom and the whole song is limited once, on the way out
+master_limiter = {"ceiling_db": -0.3, "lookahead_ms": 5.0, "release_ms": 200.0}
 
-    # Generate a frequency-swept sine wave using numpy
-    t = np.linspace(0, duration_ms / 1000.0, int(44100 * duration_ms / 1000.0))
-    frequency_sweep = np.linspace(start_frequency, end_frequency, len(t) // 2)  # Sweep faster
-    frequency_sweep = np.concatenate((frequency_sweep, np.ones(len(t) // 2) * end_frequency))  # Hold at end frequency
-    phase_acc = np.cumsum(frequency_sweep) / 44100.0
-    sine_wave = np.sin(2 * np.pi * phase_acc)
+# Gain of the lead notes in dB, just under full scale like the normalize it replaces
+lead_gain = -0.1
 
-    sine_wave = (sine_wave * 32767).astype(np.int16)
-    empty_segment = AudioSegment.silent(duration=0)
-    sine_kick = empty_segment._spawn(sine_wave.tobytes()).set_frame_rate(44100).set_channels(1).set_sample_width(2)
+# Sidechain: the bass and the noise duck under every kick, keyed from the kick's events
+sidechain = {"tracks": ["saw", "noise"], "key": "kick", "depth_db": 6.0, "attack_ms": 1.0, "hold_ms": 20.0,
+             "release_ms": 150.0, "sample_rate": frame_rate}
 
-    # Truncate the sine_kick to the desired duration minus the click's duration
-    sine_kick = sine_kick[:duration_ms - 25]
-
-    # Combine the click and sine_kick
-    combined_kick = sine_kick.overlay(click)
+# Functions to create different sound types
+# -----------------------------------------
 
-    # The generated sound might be a bit quiet, so let's increase its volume (amplify it)
-    amplified_kick = combined_kick + 6  # Increase volume by 6dB, adjust as needed
+def create_kick_drum(duration_ms, start_frequency, end_frequency, sweep, click, click_length, click_db, gain_db,
+                     trim_ms, seed=kick_seed):
+    """
+    Create a simple kick drum sound, see kick.create_kick() for the parameters.
 
-    return amplified_kick
+    The kick is cut trim_ms short of duration_ms.
+    """
+    kick = create_kick(duration_ms, start_frequency=start_frequency, end_frequency=end_frequency, sweep=sweep,
+                       click=click, click_length=click_length, click_db=click_db, gain_db=gain_db,
+                       seed=seed)
 
+    # Truncate the kick to the desired duration minus the trim
+    return kick[:duration_ms - trim_ms]
 
 
-def create_snare_drum(duration_ms):
+def create_snare_drum(duration_ms, snap, body_frequency, noise_db, body_db, gain_db, seed=snare_seed):
     """
     Create a synthetic snare drum sound.
-    """
 
-    # Snare drum parameters
-    # ---------------------
-
-    # The noise component provides the characteristic "snap" of the snare
-    noise_duration = int(duration_ms * 0.4)  # Duration of the noise segment (adjust for more/less "snap")
-
-    # The body provides the tonal component of the snare
-    body_frequency = 180  # This frequency gives a bit of the "body" of the snare. Adjust as needed.
+    Parameters:
+    - duration_ms: Length of the note the snare is made for.
+    - snap: Length of the snare as a fraction of duration_ms.
+    - body_frequency: Frequency of the sine that gives the snare its "body".
+    - noise_db: Gain of the noise, which provides the characteristic "snap".
+    - body_db: Gain of the body.
+    - gain_db: Gain of the whole snare.
+    - seed: int seed of the noise.
+    """
 
     # Create components of the snare sound
     # ------------------------------------
 
     # Generate the noise segment for the snare
-    noise_segment = WhiteNoise().to_audio_segment(duration=noise_duration)
+    noise_segment = create_noise("white", int(duration_ms * snap), seed)
 
     # Generate the tonal "body" of the snare using a sine wave
-    body_segment = Sine(body_frequency).to_audio_segment(duration=duration_ms * 0.4)
-
-    # Adjust volumes to make noise more prominent and the body less so (adjust as needed)
-    amplified_noise = noise_segment + 5  # Amplify the noise by 5dB
-    attenuated_body = body_segment - 10   # Reduce the volume of the body by 5dB
+    body_segment = create_wave("sine", body_frequency, duration_ms * snap)
 
     # Combine the noise and body
     # --------------------------
 
-    # Overlay the amplified noise on top of the attenuated body
-    # Start the noise segment at the beginning of the body segment
-    snare_combined = attenuated_body.overlay(amplified_noise, position=0)
-
-    # The result might be too quiet or too loud, so adjust volume if needed
-    amplified_snare = snare_combined + 2  # Increase volume by 2dB (adjust as needed)
+    # Overlay the noise on top of the body, both starting at the beginning
+    snare_combined = (body_segment + body_db).overlay(noise_segment + noise_db, position=0)
 
-    return amplified_snare
+    return snare_combined + gain_db
 
 
-def create_white_noise(duration_ms):
-    """Create a white noise audio segment."""
-    noise = WhiteNoise().to_audio_segment(duration=duration_ms)
+def create_white_noise(duration_ms, color, seed=noise_seed):
+    """Create a noise audio segment of the given color, the same for the same seed."""
+    noise = create_noise(color, duration_ms, seed)
     return noise
 
 
-def simple_delay(audio, delay_time, decay_factor):
-    """
-    Simulates a delay effect.
-
-    Parameters:
-    - audio: The original AudioSegment object.
-    - delay_time: Time in milliseconds for the delay.
-    - decay_factor: Multiplier for the volume of the delayed sound. 
-                    0.5 means the delayed sound is half as loud as the original.
-
-    Returns:
-    - AudioSegment with delay added.
-    """
-
-    delayed = audio._spawn(audio.raw_data, overrides={
-       "frame_rate": audio.frame_rate
-    }).set_frame_rate(audio.frame_rate * 2)
-
-    delayed = delayed - 20  # reduce volume of delayed segment
-    combined = audio.overlay(delayed, position=delay_time)
-
-    return combined.apply_gain(10 * math.log10(decay_factor))
-
-
-
-def enhance_bass_synth(audio):
+# The bass effects, declared once and run on every note of the bass table together
+bass_chain = Chain([
     # Add intensity
-    audio = audio.apply_gain(15)
-
-    # Boost lower frequencies for a more intense bass sound
-    audio = audio.low_pass_filter(120)  # retain frequencies below 120 Hz
-    
-    # Simulate basic distortion by applying excessive gain and then normalize
-    audio = audio.apply_gain(20).normalize()
-
-    # Add some cyberpunk flavor with a bit of echo
-    echo = simple_delay(audio, 100, 0.5)
-    audio = audio.overlay(echo)
+    ("gain", {"volume": 15}),
+    ("clip", {}),
 
-    # Normalize again to avoid clipping
-    audio = audio.normalize()
+    # Boost lower frequencies for a more intense bass sound: retain frequencies below 120 Hz
+    ("filter", {"design": "one_pole_lowpass", "cutoff": 120, "settle": True}),
 
-    return audio
+    # Distortion: drive the note 20dB into a tanh soft clip, which also brings it up to full level
+    ("soft_clip", {"drive": 20}),
 
-
-def create_bass(frequency, duration_ms):
-    """Create a sawtooth wave audio segment."""
-    sawtooth_wave = Sawtooth(frequency)
-    sawtooth_audio = sawtooth_wave.to_audio_segment(duration=duration_ms)
-    return enhance_bass_synth(sawtooth_audio)
+    # Add some cyberpunk flavor with a bit of echo: a single repeat after 100ms,
+    # driven 5dB into the soft clip together with the note
+    ("delay", {"delay_ms": 100, "mix": 0.04}),
+    ("soft_clip", {"drive": 5}),
+], frame_rate)
 
 
 def create_bass_table(sawtooth_frequency, duration_ms):
-    lead_wave_table = {
-    1:  create_bass(sawtooth_frequency / 2.0, duration_ms),
-    13:  create_bass(sawtooth_frequency, duration_ms)
-
+    """Create a lazy, cached bass table: note 1 an octave below sawtooth_frequency, note 13 on it."""
+    frequencies = {
+    1:  sawtooth_frequency / 2.0,
+    13:  sawtooth_frequency
     }
-    return lead_wave_table 
+
+    def synthesize(notes):
+        # Every note the song plays goes through the oscillators and the effects together,
+        # and stays float32 for the mixer
+        table = note_table("saw", np.array([[frequencies[note]] for note in notes]), duration_ms)
+        return bass_chain(table)
+
+    synthesize = sample_cache.notes("bass", synthesize, frequency=sawtooth_frequency, duration_ms=duration_ms,
+                                    effects=bass_chain.describe(), frame_rate=frame_rate)
+    return LazyNoteTable(synthesize, frequencies)
 
 
 def create_lead_synthesizer(frequency, duration_ms, vibrato_depth=0.5, vibrato_rate=6):
@@ -183,109 +168,127 @@ def create_lead_synthesizer(frequency, duration_ms, vibrato_depth=0.5, vibrato_r
 
     sample_rate = 44100
     num_samples = int(duration_ms * sample_rate / 1000)  # total samples for the given duration
-    t = np.linspace(0, duration_ms / 1000, num_samples)   # Time array in seconds
-    
-    vibrato = vibrato_depth * np.sin(2 * np.pi * vibrato_rate * t)
-    samples = np.sin(2 * np.pi * (frequency + vibrato) * t) * 32767  # 32767 for 16-bit PCM
+
+    # Vibrato LFO on the frequency; the modulation integrates it into the phase,
+    # so the pitch swings by vibrato_depth all through the note
+    modulation = matrix([route("sine", vibrato_rate, "frequency", vibrato_depth)], num_samples, sample_rate)
+    samples = np.sin(2 * np.pi * modulation.phase(frequency)) * 32767  # 32767 for 16-bit PCM
 
     # Convert to pydub audio segment
     samples = samples.astype(np.int16)  # convert to int16 for 2-byte samples
     lead_audio = AudioSegment(samples.tobytes(), frame_rate=sample_rate, sample_width=2, channels=1)
 
-    # delay
-    echo = simple_delay(lead_audio, 50, 0.7)
-    lead_audioaudio = lead_audio.overlay(echo)
-
-    # Normalize volume
-    lead_audio = lead_audio.normalize()
+    # A fixed gain; the master limiter looks after the peaks, so notes aren't normalized one by one
+    lead_audio = lead_audio.apply_gain(lead_gain)
 
     return lead_audio
 
 
 def create_lead(frequency, duration_ms):
     """Create a lead sound."""
-    sine_wave = Sine(frequency)
     # Amplifying the sine wave to get a stronger, more pronounced sound for the lead
-    sine_audio = sine_wave.to_audio_segment(duration=duration_ms).apply_gain(3)
+    sine_audio = create_wave("sine", frequency, duration_ms, volume=3)
 
     return sine_audio
 
 
-def create_lead_wave_table(base_frequency=261.63, duration_ms=1000):
-    """Create a lead wave table for 12 chromatic notes starting from the given base frequency."""
+# The lead effects, run on every note of the lead table together
+lead_chain = Chain([("gain", {"volume": lead_gain})], frame_rate)
+
+
+def create_lead_wave_table(base_frequency=261.63, duration_ms=1000, vibrato_depth=0.5, vibrato_rate=6, notes=12):
+    """
+    Create a lazy lead wave table of chromatic notes starting from the given base frequency.
+
+    Notes are only synthesized once the song plays them (or prewarm_song()
+    asks for them), and the ones asked for together are synthesized as one
+    notes x samples array, each row sounding exactly like
+    create_lead_synthesizer() for that note.
 
-    # Frequencies for 12-TET (Twelve-tone equal temperament) chromatic scale
-    # Using the formula: f_n = f_0 * (2^(1/12))^n
-    # where f_0 is the base frequency and n is the number of half steps.
+    Returns:
+    - LazyNoteTable of note index (1 to notes) -> float32 samples, played by the mixer as is.
+    """
+    sample_rate = 44100
+    num_samples = int(duration_ms * sample_rate / 1000)
 
-    frequencies = [base_frequency * (2**(1/12))**i for i in range(12)]
+    # The vibrato and its phase integral are shared by every note, so they broadcast down the rows
+    modulation = matrix([route("sine", vibrato_rate, "frequency", vibrato_depth)], num_samples, sample_rate)
 
-    note_names = ['c', 'c#', 'd', 'd#', 'e', 'f', 'f#', 'g', 'g#', 'a', 'a#', 'b']
+    def synthesize(indices):
+        # Frequencies for the 12-TET (Twelve-tone equal temperament) chromatic scale, one per row
+        frequencies = chromatic_frequencies(base_frequency, steps=np.asarray(indices) - 1)
+        samples = np.sin(2 * np.pi * modulation.phase(frequencies)) * 32767
 
-    lead_wave_table = {}
-    for i, note in enumerate(note_names):
-        lead_wave_table[i+1] = create_lead_synthesizer(frequencies[i], duration_ms)
+        # The synthesizer has no echo, so its gain is the only effect
+        return lead_chain(samples.astype(np.int16))
 
-    return lead_wave_table
+    synthesize = sample_cache.notes("lead", synthesize, base_frequency=base_frequency, duration_ms=duration_ms,
+                                    vibrato_depth=vibrato_depth, vibrato_rate=vibrato_rate,
+                                    vibrato="integrated", effects=lead_chain.describe(), frame_rate=frame_rate)
+    return LazyNoteTable(synthesize, range(1, notes + 1))
 
 
 # Creating sound segments
 # -----------------------
-kick_drum_sound = create_kick_drum(sound_duration // 8)
-snare_drum_sound = create_snare_drum(sound_duration // 8)
-white_noise_sound = create_white_noise(sound_duration // 8)
+
+def cached_sound(name, create, **params):
+    """Synthesize create(**params) at the mix rate through the sample cache, keyed by those same params."""
+    return sample_cache.sound(name, lambda frame_rate, **params: mix_samples(create(**params), frame_rate),
+                              frame_rate=frame_rate, **params)
+
+
+kick_drum_sound = cached_sound("kick", create_kick_drum,
+                               duration_ms=sound_duration // 8,
+                               # Sweep from 150 Hz to 50 Hz over the first half (sweep faster), then hold
+                               start_frequency=150.0, end_frequency=50.0, sweep=0.5,
+                               # A quiet white noise click (5% of the kick, -30dB) and 6dB more volume
+                               click="noise", click_length=0.05, click_db=-30, gain_db=6,
+                               # Cut the kick short by the click's duration
+                               trim_ms=25, seed=kick_seed)
+snare_drum_sound = cached_sound("snare", create_snare_drum,
+                                duration_ms=sound_duration // 8,
+                                # Adjust the snap for more or less "snap", and the body frequency for more "body"
+                                snap=0.4, body_frequency=180,
+                                # The noise more prominent and the body less so, then 2dB more for the whole snare
+                                noise_db=5, body_db=-10, gain_db=2, seed=snare_seed)
+white_noise_sound = cached_sound("noise", create_white_noise, duration_ms=sound_duration // 8, color="white",
+                                 seed=noise_seed)
 sawtooth_wave_sound = create_bass_table(sawtooth_frequency, sound_duration // 8)
 lead_sound_dict = create_lead_wave_table(sine_frequency, sound_duration // 8)
 
 
 print("Expected kick duration:", sound_duration // 8)
-print("Actual kick duration:", len(kick_drum_sound))
+print("Actual kick duration:", round(len(kick_drum_sound) * 1000 / frame_rate))
+
+# Map each sound name to its corresponding sound
+sound_map = {
+    "kick": ("drum", kick_drum_sound),
+    "snare": ("drum", snare_drum_sound),
+    "noise": ("drum", white_noise_sound),
+    "saw": ("note", sawtooth_wave_sound),
+    "lead": ("note", lead_sound_dict)
+}
+
+# The same sounds as float32 samples at the mix rate, which is what the mixer plays
+voices = build_voices(sound_map, frame_rate)
 
 
 #  Sequencer function
 #  ------------------
 
-def sequencer(sound_block, sound_duration, levels, loops=1):
-    """Generates a sequence based on sound blocks."""
-
-    # Map each sound name to its corresponding sound
-    sound_map = {
-        "kick": ("drum", kick_drum_sound),
-        "snare": ("drum", snare_drum_sound),
-        "noise": ("drum", white_noise_sound),
-        "saw": ("note", sawtooth_wave_sound),
-        "lead": ("note", lead_sound_dict)
-    }
-
-    # Placeholder for the final track
-    final_track = AudioSegment.silent(duration=sound_duration)
-
-    for sound_name, pattern in sound_block.items():
-        # Placeholder for individual sound tracks
-        track = AudioSegment.empty()
-
-        for step in pattern:
-            # Define a silent segment
-            segment = AudioSegment.silent(duration=sound_duration // 8)
-
-            # if drum
-            if sound_map[sound_name][0] == "drum":
-                # Overlay sound if 1
-                if step == 1:
-                    segment = segment.overlay(sound_map[sound_name][1] - levels[sound_name])
-            elif sound_map[sound_name][0] == "note":
-                # Overlay sound if it's not 0
-                if step != 0:
-                    segment = segment.overlay(sound_map[sound_name][1][step] - levels[sound_name])
+def mix_section(sound_block, levels, bpm):
+    """Mixes one pass of a sound block, returning its float32 samples, unclipped for the master limiter."""
+    # Compile the block to an event table, then mix every note straight into one buffer
+    events, length = compile_block(sound_block, voices, levels, bpm, steps_per_bar, frame_rate)
+    return mix_events(events, voices, length, clip=False, sidechain=sidechain)
 
-            # Add the segment to the track
-            track += segment
 
-        # Overlay this track on top of final track
-        final_track = final_track.overlay(track)
+def sequencer(sound_block, sound_duration, levels, loops=1):
+    """Generates a sequence based on sound blocks."""
+    final_track = mix_section(sound_block, levels, 4 * 60000 / sound_duration)
 
     # Loop the track the specified number of times
-    return final_track * loops * 2
+    return to_audio_segment(np.tile(final_track, loops * 2), frame_rate)
 
 
 #  Intro: Simple Kick drum and sine wave to introduce the song
@@ -351,6 +354,14 @@ levels = {
     "saw": 23
 }
 
+# Send buses: name -> (impulse response, sends). Sends are in dB of attenuation
+# like the levels, and come after them but before the sidechain; tracks left out
+# send nothing. Every bus goes through a convolution reverb and comes back into the mix.
+send_buses = {
+    "space": (synthetic_ir(rt60=3.0, predelay_ms=20.0, sample_rate=frame_rate, seed=reverb_seed),
+              {"snare": 10, "lead": 6, "noise": 6}),
+}
+
 # Combining the song sections
 # ---------------------------
 
@@ -366,59 +377,289 @@ song_structure = [
 ]
 
 
-def generate_song(song_structure, track_to_play=None):
+def focus_block(block, track_to_play=None):
+    """Filters a block down to track_to_play, or returns it whole if no track is given."""
+    return {track_to_play: block[track_to_play]} if track_to_play else block
+
+
+def mix_sends(sound_block, length):
+    """Mixes one pass of every send bus of a block, returning a dict of bus name -> float32 samples."""
+    sent = {}
+    for bus, (_, sends) in send_buses.items():
+        bus_block = {track: steps for track, steps in sound_block.items() if track in sends}
+        bus_levels = {track: levels[track] + sends[track] for track in bus_block}
+        events, _ = compile_block(bus_block, voices, bus_levels, bpm, steps_per_bar, frame_rate)
+        sent[bus] = mix_events(events, voices, length, clip=False)
+    return sent
+
+
+def prewarm_song(song_structure, track_to_play=None):
+    """Synthesizes every note the song plays up front, in one batch per instrument."""
+    compiled = [compile_block(focus_block(block, track_to_play), voices, levels, bpm, steps_per_bar, frame_rate)
+                for block, _ in song_structure]
+    prewarm(voices, [events for events, _ in compiled])
+
+
+def render_sections(song_structure, track_to_play=None, workers=None):
+    """
+    Mixes every distinct section of a song once, using a pool of processes.
+
+    Parameters:
+    - song_structure: List of (block, repetitions) pairs defining the song.
+    - track_to_play: If provided, only this track will be included in the sections.
+    - workers: Number of processes to use, defaults to one per core.
+
+    Returns:
+    - Dict of section_key() -> float32 samples.
+    """
+    jobs = {}
+    for block, _ in song_structure:
+        focused_block = focus_block(block, track_to_play)
+        key = section_key(focused_block, levels, bpm, steps_per_bar)
+        if key not in jobs:
+            jobs[key] = compile_block(focused_block, voices, levels, bpm, steps_per_bar, frame_rate)
+
+    return dict(zip(jobs, mix_parallel(list(jobs.values()), voices, workers, clip=False, sidechain=sidechain)))
+
+
+def song_sections(song_structure, track_to_play=None, rendered=None):
+    """
+    Yields the sections of a song in order as (samples, frame_rate, passes).
+
+    Repeated blocks are only mixed the first time they come up, later uses
+    reuse the same samples. Sections already in `rendered` are not mixed again.
+    """
+    # Sections already rendered in this song, so repeated blocks are only mixed once
+    rendered = {} if rendered is None else rendered
+
+    for block, repetitions in song_structure:
+        focused_block = focus_block(block, track_to_play)
+
+        key = section_key(focused_block, levels, bpm, steps_per_bar)
+        if key not in rendered:
+            rendered[key] = mix_section(focused_block, levels, bpm)
+
+        # Each repetition plays the block twice, same as sequencer()
+        yield rendered[key], frame_rate, repetitions * 2
+
+
+def song_length(song_structure, track_to_play=None):
+    """Length of the song in samples at frame_rate, with the reverb tails, as generate_song() renders it."""
+    length = 0
+    for block, repetitions in song_structure:
+        _, block_length = compile_block(focus_block(block, track_to_play), voices, levels, bpm, steps_per_bar,
+                                        frame_rate)
+        length += block_length * repetitions * 2
+
+    # The reverbs ring out for all but the last sample of the longest impulse response
+    return length + max((len(impulse) - 1 for impulse, _ in send_buses.values()), default=0)
+
+
+def ring_out(reverbs):
+    """Lets every reverb ring out, returning a dict of bus name -> its tail, all padded to the longest."""
+    tails = {bus: reverb.tail() for bus, reverb in reverbs.items()}
+    length = max((len(tail) for tail in tails.values()), default=0)
+    return {bus: np.pad(tail, (0, length - len(tail))) for bus, tail in tails.items()}
+
+
+def wet_sections(song_structure, track_to_play=None, rendered=None):
+    """
+    Yields the sections of a song with the send buses' reverb added, as (samples, frame_rate, passes).
+
+    The reverbs run through the whole song in one go, so their tails carry on
+    from one section into the next, and the song ends with them ringing out.
+    Every pass of a section sounds different, so they come one at a time.
+    """
+    reverbs = {bus: Reverb(impulse) for bus, (impulse, _) in send_buses.items()}
+    sent = {}
+
+    for (samples, rate, passes), (block, _) in zip(song_sections(song_structure, track_to_play, rendered),
+                                                   song_structure):
+        focused_block = focus_block(block, track_to_play)
+
+        key = section_key(focused_block, levels, bpm, steps_per_bar)
+        if key not in sent:
+            sent[key] = mix_sends(focused_block, len(samples))
+
+        for _ in range(passes):
+            wet = samples.copy()
+            for bus, reverb in reverbs.items():
+                wet += reverb(sent[key][bus])
+            yield wet, rate, 1
+
+    if reverbs:
+        yield sum(ring_out(reverbs).values()), frame_rate, 1
+
+
+def generate_song(song_structure, track_to_play=None, parallel=False, workers=None):
     """
     Generates a song based on the provided song structure.
 
     Parameters:
     - song_structure: List of (block, repetitions) pairs defining the song.
     - track_to_play: If provided, only this track will be included in the final song.
+    - parallel: If True, the distinct sections are mixed in a pool of processes first.
+                The result is identical to the serial render.
+    - workers: Number of processes for the parallel render, defaults to one per core.
 
     Returns:
     - AudioSegment containing the constructed song.
     """
-    song = AudioSegment.empty()
+    prewarm_song(song_structure, track_to_play)
+    rendered = render_sections(song_structure, track_to_play, workers) if parallel else None
+
+    # Run the sections through the master limiter in order, straight into one buffer of the song's length
+    master = Limiter(sample_rate=frame_rate, **master_limiter)
+    chunks = iter_chunks(wet_sections(song_structure, track_to_play, rendered), frame_rate, master=master)
+    song = assemble(chunks, song_length(song_structure, track_to_play))
+
+    return to_audio_segment(song, frame_rate)
+
+
+def generate_song_chunks(song_structure, track_to_play=None, chunk_frames=CHUNK_FRAMES):
+    """
+    Generates a song as a stream of fixed-size PCM chunks.
+
+    Sections are rendered as they come up and cut into chunks, so the whole
+    song never has to be in memory. Feed the chunks to write_wav() to render
+    straight to disk.
+
+    Parameters:
+    - song_structure: List of (block, repetitions) pairs defining the song.
+    - track_to_play: If provided, only this track will be included in the song.
+    - chunk_frames: Number of frames per chunk.
+
+    Yields:
+    - int16 numpy arrays of mono samples at frame_rate.
+    """
+    prewarm_song(song_structure, track_to_play)
+    master = Limiter(sample_rate=frame_rate, **master_limiter)
+    return iter_chunks(wet_sections(song_structure, track_to_play), frame_rate, chunk_frames, master)
+
+
+def stem_passes(song_structure, track_names):
+    """
+    Yields the song one pass at a time as a dict of name -> samples, for the
+    master (before the limiter), every track in track_names and every send bus's return.
+
+    Every section is rendered once, with its stems; only the reverb returns
+    and the master, which has them in it, are new on every pass. At the end
+    the reverbs ring out, with the tracks silent.
+    """
+    prewarm_song(song_structure)
+
+    rendered = {}
+    sent = {}
+    reverbs = {bus: Reverb(impulse) for bus, (impulse, _) in send_buses.items()}
 
     for block, repetitions in song_structure:
-        # If track_to_play is given, the block is filtered to only keep that track's patterns.
-        # Otherwise, the whole block is used.
-        focused_block = {track_to_play: block[track_to_play]} if track_to_play else block
-        section = sequencer(focused_block, sound_duration, levels, repetitions)
-        song += section
+        key = section_key(block, levels, bpm, steps_per_bar)
+        if key not in rendered:
+            events, length = compile_block(block, voices, levels, bpm, steps_per_bar, frame_rate)
+            rendered[key] = render_stems(events, voices, length, clip=False, sidechain=sidechain)
+            sent[key] = mix_sends(block, length)
+
+        # Each repetition plays the block twice, same as sequencer()
+        section, stems = rendered[key]
+        for _ in range(repetitions * 2):
+            blocks = {track: stems[track] for track in track_names}
+            blocks["master"] = section.copy()
+            for bus, reverb in reverbs.items():
+                blocks[bus] = reverb(sent[key][bus])
+                blocks["master"] += blocks[bus]
+            yield blocks
+
+    if reverbs:
+        tails = ring_out(reverbs)
+        silence = np.zeros_like(next(iter(tails.values())))
+        blocks = {track: silence for track in track_names}
+        blocks.update(tails)
+        blocks["master"] = sum(tails.values())
+        yield blocks
+
+
+def generate_stems(song_structure, directory, name="my_song", channels=2):
+    """
+    Renders the full mix, one stem per track and one per send bus in a single pass.
+
+    Every section is rendered once, and its tracks are used both as stems and
+    to build the mix, so nothing is synthesized or scheduled twice. The bus
+    stems are the reverb returns. All stems line up sample for sample with the
+    mix, with silence at the end while the reverb rings out.
 
-    return song
+    Parameters:
+    - song_structure: List of (block, repetitions) pairs defining the song.
+    - directory: Folder to write the WAV files to.
+    - name: Base file name; the mix is <name>.wav and stems are <name>_<track>.wav.
+    - channels: Number of channels of the files.
+
+    Returns:
+    - Dict of track name (and "master" for the mix, and the bus names for
+      the reverb returns) -> path of the written file.
+    """
+    track_names = list(dict.fromkeys(track for block, _ in song_structure for track in block))
+    names = ["master"] + track_names + list(send_buses)
+    paths = {track: os.path.join(directory, f"{name}.wav" if track == "master" else f"{name}_{track}.wav")
+             for track in names}
+
+    # Only the mix goes through the master limiter; the stems are left as they were mixed
+    writers = {track: WavWriter(paths[track], frame_rate, channels,
+                                Limiter(sample_rate=frame_rate, **master_limiter) if track == "master" else None)
+               for track in names}
+    try:
+        for blocks in stem_passes(song_structure, track_names):
+            for track, samples in blocks.items():
+                writers[track].write(samples)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    return paths
 
 
 # Generate the song
 # -----------------
 
-song = AudioSegment.empty()
+# Only when run as a script, so worker processes can import this module safely
+if __name__ == "__main__":
+    song = AudioSegment.empty()
+
+    # full_song = generate_song(song_structure, track_to_play="kick")
+    # full_song = generate_song(song_structure, parallel=True)  # mix sections on every core
+    full_song = generate_song(song_structure)
+
+    # You can save and play each version as needed:
+    downloads = os.path.join(os.path.expanduser("~"), "Downloads")
 
-# full_song = generate_song(song_structure, track_to_play="kick")
-full_song = generate_song(song_structure)
+    # For long sets, render straight to disk without holding the song in memory:
+    # from stream import write_wav
+    # write_wav(os.path.join(downloads, "my_song.wav"), generate_song_chunks(song_structure), 44100, channels=2)
 
-# You can save and play each version as needed:
-wav_path = os.path.join(os.path.expanduser("~"), "Downloads", "my_song.wav")
-mp3_path = os.path.join(os.path.expanduser("~"), "Downloads", "my_song.mp3")
+    # Or write the mix and a stem for every track in one go:
+    # generate_stems(song_structure, downloads)
 
+    # The PCM is written once and every format is encoded from it; unchanged files are skipped
+    full_song = full_song.set_frame_rate(44100)
+    export([segment_to_array(full_song)], downloads, "my_song", ["wav", "mp3"], 44100, channels=2)
+    # export(generate_song_chunks(song_structure), downloads, "my_song", ["wav", "mp3", "flac", "ogg"])
 
-full_song = full_song.set_channels(2)
-full_song = full_song.set_frame_rate(44100)
-full_song.export(mp3_path, format="mp3", bitrate="192k")
+    # Or encode while rendering, piping the chunks straight into ffmpeg:
+    # from export import encode_stream
+    # stats = encode_stream(generate_song_chunks(song_structure), os.path.join(downloads, "my_song.mp3"))
+    # print(f"{stats['audio_seconds']:.1f} s of audio in {stats['seconds']:.2f} s ({stats['speed']:.0f}x real time), "
+    #       f"{stats['render_seconds']:.2f} s rendering, {stats['encode_seconds']:.2f} s waiting on the encoder")
 
-# For the full song
-full_song.export(wav_path, format="wav")
-full_song.export(mp3_path, format="mp3", bitrate="192k")
+    full_song = full_song.set_channels(2)
 
 
-play(full_song)
+    play(full_song)
 
 
-# Play the song
-# -------------
+    # Play the song
+    # -------------
 
-# Convert song's sample rate to 44100 Hz
-song = song.set_frame_rate(44100)
+    # Convert song's sample rate to 44100 Hz
+    song = song.set_frame_rate(44100)
 
-# Then play the song
-play(song)
+    # Then play the song
+    play(song)
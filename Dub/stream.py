@@ -0,0 +1,183 @@
+import wave
+
+import numpy as np
+from pydub.utils import audioop
+
+from effects import quantize
+
+# Streaming render to disk
+# ------------------------
+#
+# Instead of building the whole song as one AudioSegment and exporting it, the
+# rendered sections are cut into fixed-size PCM chunks and written to the WAV
+# file as they come, so memory stays around one section plus one chunk no
+# matter how long the song is.
+
+# Frames per chunk handed to the writer (about 1.5 s at 44.1 kHz)
+CHUNK_FRAMES = 65536
+
+
+class Resampler:
+    """
+    Resamples consecutive pieces of one stream to a fixed output rate.
+
+    audioop's converter state is carried from one piece to the next, so the
+    result is identical to calling set_frame_rate() on the whole song at once.
+    """
+
+    def __init__(self, frame_rate):
+        self.frame_rate = frame_rate
+        self.in_rate = None
+        self.state = None
+
+    def __call__(self, pcm, rate):
+        if rate == self.frame_rate:
+            return pcm
+
+        if rate != self.in_rate:
+            # A new source rate starts a new conversion
+            self.in_rate = rate
+            self.state = None
+
+        data, self.state = audioop.ratecv(pcm.tobytes(), 2, 1, rate, self.frame_rate, self.state)
+        return np.frombuffer(data, dtype=np.int16)
+
+
+def _to_pcm(samples, dither):
+    # The one place the song is quantized, with one dither sequence running through the whole stream
+    return samples if samples.dtype == np.int16 else quantize(samples, seed=dither)
+
+
+def _passes(parts, frame_rate, master):
+    # Every pass of every part in order as int16 (samples, rate), through the master limiter if there is one
+    dither = np.random.default_rng(0)
+    if master is None:
+        for samples, rate, passes in parts:
+            pcm = _to_pcm(samples, dither)
+            for _ in range(passes):
+                yield pcm, rate
+        return
+
+    def blocks():
+        for samples, rate, passes in parts:
+            if rate != frame_rate:
+                raise ValueError(f"a master limiter needs every part at {frame_rate} Hz, got {rate} Hz")
+            for _ in range(passes):
+                yield samples
+
+    for block in master.stream(blocks()):
+        yield _to_pcm(block, dither), frame_rate
+
+
+def iter_chunks(parts, frame_rate, chunk_frames=CHUNK_FRAMES, master=None):
+    """
+    Cut rendered sections into fixed-size int16 chunks at one sample rate.
+
+    Float parts are quantized here, once, with TPDF dither (see effects.quantize()).
+
+    Parameters:
+    - parts: Iterable of (samples, frame_rate, passes) tuples in song order. It
+             can be a generator, so sections only need to exist while they play.
+    - frame_rate: Sample rate of the chunks.
+    - chunk_frames: Frames per chunk; only the last chunk can be shorter.
+    - master: Optional dynamics.Limiter the whole stream runs through, once,
+              before it is quantized. Every part must be at frame_rate then.
+
+    Yields:
+    - int16 numpy arrays of chunk_frames samples.
+    """
+    resample = Resampler(frame_rate)
+    carry = np.zeros(0, dtype=np.int16)
+
+    for pcm, rate in _passes(parts, frame_rate, master):
+        piece = resample(pcm, rate)
+        if len(carry):
+            piece = np.concatenate((carry, piece))
+
+        full = len(piece) - len(piece) % chunk_frames
+        for start in range(0, full, chunk_frames):
+            yield piece[start:start + chunk_frames]
+        carry = piece[full:]
+
+    if len(carry):
+        yield carry
+
+
+class WavWriter:
+    """
+    Writes blocks to a 16-bit WAV file as they are pushed to it.
+
+    Where write_wav() pulls its chunks from one stream, writers are pushed
+    to, so a single render can feed several files side by side, e.g. a mix
+    and its stems. Float blocks are quantized with dither as they come.
+
+    Parameters:
+    - path: Output file path.
+    - frame_rate: Sample rate of the blocks.
+    - channels: Channels to write; mono blocks are copied to every channel.
+    - master: Optional dynamics.Limiter every block goes through first, with
+              its delay taken back out as in Limiter.stream().
+    """
+
+    def __init__(self, path, frame_rate, channels=1, master=None):
+        self.channels = channels
+        self.master = master
+        self.frames = 0
+        self._skip = master.lookahead if master is not None else 0
+        self._dither = np.random.default_rng(0)
+
+        self._wav = wave.open(path, "wb")
+        self._wav.setnchannels(channels)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(frame_rate)
+
+    def write(self, samples):
+        """Write a mono block of int16 or float samples at 16-bit scale."""
+        if self.master is not None:
+            samples = self.master(samples)
+            dropped = min(self._skip, len(samples))
+            samples, self._skip = samples[dropped:], self._skip - dropped
+            if not len(samples):
+                return
+        self._write_pcm(_to_pcm(samples, self._dither))
+
+    def _write_pcm(self, pcm):
+        if self.channels > 1:
+            pcm = np.repeat(pcm, self.channels)
+        # The header is only patched with the final length on close
+        self._wav.writeframesraw(pcm.tobytes())
+        self.frames += len(pcm) // self.channels
+
+    def close(self):
+        """Flush the master limiter, if any, and finish the file. Returns the number of frames written."""
+        if self.master is not None:
+            self._write_pcm(_to_pcm(self.master.flush()[self._skip:], self._dither))
+            self.master = None
+        self._wav.close()
+        return self.frames
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def write_wav(path, chunks, frame_rate, channels=1):
+    """
+    Write int16 mono chunks to a 16-bit WAV file as they arrive.
+
+    Parameters:
+    - path: Output file path.
+    - chunks: Iterable of int16 numpy arrays, e.g. from iter_chunks().
+    - frame_rate: Sample rate of the chunks.
+    - channels: Channels to write; mono chunks are copied to every channel.
+
+    Returns:
+    - Number of frames written.
+    """
+    with WavWriter(path, frame_rate, channels) as wav:
+        for chunk in chunks:
+            wav.write(chunk)
+
+    return wav.frames
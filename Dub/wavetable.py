@@ -0,0 +1,196 @@
+import numpy as np
+from pydub import AudioSegment
+from pydub.utils import db_to_float, ratio_to_db
+
+from oscillators import WAVEFORMS, to_pcm
+
+# Batched note tables
+# -------------------
+#
+# A note table used to be built one note at a time: twelve oscillator calls,
+# each followed by its own effect passes on an AudioSegment. Here the whole
+# table is one (notes x samples) array. The oscillators render every row in
+# the same array operations, and the per-note effects run across all rows at
+# once, so a four octave table costs about what a single wide array op does.
+# The notes are handed out as row views, nothing is copied per note.
+#
+# LazyNoteTable goes one step further and only renders the notes a song
+# actually plays, on first use or all together when the song is prewarmed.
+
+# Frequency ratio of one semitone in 12-TET
+SEMITONE = 2 ** (1 / 12)
+
+
+def chromatic_frequencies(base_frequency=261.63, count=12, steps=None):
+    """
+    Frequencies of `count` chromatic notes starting at base_frequency.
+
+    Parameters:
+    - base_frequency: Frequency of the first note in Hz.
+    - count: Number of notes.
+    - steps: Semitones above base_frequency of the notes to return, instead of 0 to count - 1.
+
+    Returns:
+    - (notes, 1) float64 column, ready to be passed to the oscillators as one note per row.
+    """
+    steps = np.arange(count) if steps is None else np.asarray(steps)
+    return (base_frequency * SEMITONE ** steps.astype(np.float64))[:, None]
+
+
+def note_table(waveform, frequencies, duration_ms, volume=0.0, sample_rate=44100):
+    """
+    Render one oscillator note per row.
+
+    Every row comes out exactly as oscillators.create_wave() makes that note.
+
+    Parameters:
+    - waveform: "sine", "saw", "square" or "triangle".
+    - frequencies: (notes, 1) column of frequencies, e.g. from chromatic_frequencies().
+    - duration_ms: Length of every note in milliseconds.
+    - volume: Gain in dB, 0 for full scale.
+    - sample_rate: Sample rate in Hz.
+
+    Returns:
+    - int16 numpy array of notes x samples.
+    """
+    num_samples = int(sample_rate * duration_ms / 1000.0)
+    return to_pcm(WAVEFORMS[waveform](frequencies, num_samples, sample_rate), volume)
+
+
+def normalize(table, headroom=0.1):
+    """
+    Normalize every row of an int16 table on its own, like AudioSegment.normalize().
+
+    The gains are worked out with pydub's own dB helpers and applied with
+    audioop's rounding, so each row matches what normalize() makes of that note.
+
+    Parameters:
+    - table: int16 numpy array of notes x samples.
+    - headroom: How far below full scale to bring each peak, in dB.
+
+    Returns:
+    - New int16 table.
+    """
+    # The loudest sample either way, without an int32 copy of the table
+    peaks = np.maximum(table.max(axis=1).astype(np.int32), -table.min(axis=1).astype(np.int32))
+    target = 32768 * db_to_float(-headroom)
+
+    # Silent rows are left alone
+    gains = np.array([db_to_float(ratio_to_db(target / peak)) if peak else 1.0 for peak in peaks.tolist()])
+    return _scale(table, gains[:, None])
+
+
+def apply_gain(table, volume):
+    """
+    Change the volume of an int16 table, like AudioSegment.apply_gain() on every row.
+
+    Parameters:
+    - table: int16 numpy array of any shape.
+    - volume: Gain in dB; anything pushed past full scale is clipped.
+
+    Returns:
+    - New int16 table.
+    """
+    return _scale(table, db_to_float(float(volume)))
+
+
+# Most samples _scale() works on at once
+SCALE_BLOCK = 1 << 17
+
+
+def _scale(table, gains):
+    # A few rows at a time: a float64 copy of a whole big table costs more to
+    # allocate than the arithmetic on it, a small one is reused from the heap
+    gains = np.broadcast_to(np.asarray(gains, dtype=np.float64), (len(table), 1))
+    rows = max(SCALE_BLOCK // max(table.shape[-1], 1), 1)
+    result = np.empty(table.shape, dtype=np.int16)
+
+    for start in range(0, len(table), rows):
+        scaled = table[start:start + rows] * gains[start:start + rows]
+        # audioop clips, snaps anything below -32767 to the minimum and rounds
+        # down: clipping at -32768 before rounding down does all three
+        np.clip(scaled, -32768, 32767, out=scaled)
+        result[start:start + rows] = np.floor(scaled, out=scaled)
+
+    return result
+
+
+def note_views(table, first=1):
+    """
+    Hand out the rows of a table as a note table dict.
+
+    Parameters:
+    - table: numpy array of notes x samples.
+    - first: Index of the first row in the dict.
+
+    Returns:
+    - Dict of note index -> row. The rows are views into table.
+    """
+    return {first + i: row for i, row in enumerate(table)}
+
+
+def note_segments(table, sample_rate=44100, first=1):
+    """
+    Turn the rows of an int16 table into AudioSegments, for the pydub sequencers.
+
+    Parameters:
+    - table: int16 numpy array of notes x samples.
+    - sample_rate: Sample rate in Hz.
+    - first: Index of the first row in the dict.
+
+    Returns:
+    - Dict of note index -> 16-bit mono AudioSegment.
+    """
+    return {
+        index: AudioSegment(row.tobytes(), frame_rate=sample_rate, sample_width=2, channels=1)
+        for index, row in note_views(table, first).items()
+    }
+
+
+class LazyNoteTable(dict):
+    """
+    Note table that only synthesizes a note the first time it is asked for.
+
+    It is a dict of note index -> sound, so the sequencers and the mixer use it
+    like any other note table, but it starts out empty: looking up a missing
+    note synthesizes it and keeps it. prewarm() fills in a whole set of notes
+    in one batch, e.g. every note a compiled song plays (see mixer.prewarm()).
+
+    Parameters:
+    - synthesize: Function taking a sorted list of note indices and returning
+                  their sounds in the same order (a 2-D table of rows works).
+    - notes: The note indices the table can play.
+    """
+
+    def __init__(self, synthesize, notes):
+        super().__init__()
+        self.synthesize = synthesize
+        self.notes = frozenset(notes)
+
+    def __missing__(self, note):
+        self.prewarm([note])
+        return self[note]
+
+    def prewarm(self, notes):
+        """Synthesize every note in `notes` that isn't in the table yet, all in one batch."""
+        missing = sorted(set(notes) - self.keys())
+        unknown = [note for note in missing if note not in self.notes]
+        if unknown:
+            raise KeyError(unknown[0])
+
+        if missing:
+            for note, sound in zip(missing, self.synthesize(missing)):
+                self[note] = sound
+
+    def convert(self, function):
+        """
+        Lazy table of function(sound) for every note of this one.
+
+        Notes are synthesized here and converted there on first use, so both
+        tables stay lazy.
+        """
+        def synthesize(notes):
+            self.prewarm(notes)
+            return [function(self[note]) for note in notes]
+
+        return LazyNoteTable(synthesize, self.notes)
@@ -1,6 +1,14 @@
+import os
+import sys
+
 import sounddevice as sd
 import numpy as np
 
+# The synth modules live in Dub/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Dub"))
+from envelope import adsr, apply_envelope, decay
+from noise import white_noise
+
 # Define parameters
 sampling_frequency = 44100.0
 duration = 5.0
@@ -21,23 +29,12 @@ hihat_pattern = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
 # hihat_pattern = [0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1, 0, 1]
 
 
-def create_kick_sound(frequency, duration, sample_rate):
-    t = np.linspace(0, duration, int(sample_rate * duration), False)
-
-    # ADSR envelope parameters
-    attack_time = 0.01
-    decay_time = 0.1
-    sustain_level = 0.3
-    sustain_time = duration - attack_time - decay_time
-    release_time = 0.1
-
-    # Calculate envelope
-    attack = np.linspace(0, 1, int(attack_time * sample_rate))
-    decay = np.linspace(1, sustain_level, int(decay_time * sample_rate))
-    sustain = np.ones(int(sustain_time * sample_rate)) * sustain_level
-    release = np.linspace(sustain_level, 0, int(release_time * sample_rate))
+def create_kick_sound(frequency, duration, sample_rate, seed=0):
+    num_samples = int(sample_rate * duration)
+    t = np.linspace(0, duration, num_samples, False)
 
-    envelope = np.concatenate([attack, decay, sustain, release])
+    # ADSR envelope, fitted into the kick so the release is always heard
+    envelope = adsr(0.01, 0.1, 0.3, 0.1, num_samples, sample_rate)
 
     # Modulate frequency to get the kick sound
     start_freq = frequency * 1.5
@@ -46,12 +43,12 @@ def create_kick_sound(frequency, duration, sample_rate):
 
     # # Generate waveform and apply envelope
     kick = np.sin(2 * np.pi * freqs * t)
-    kick_with_envelope = kick * envelope[:kick.size]
+    kick_with_envelope = apply_envelope(kick, envelope)
 
     # Add some noise for the beater sound (optional)
-    noise = np.random.normal(0, 0.5, kick_with_envelope.shape)
-    noise_envelope = np.exp(-t / 0.05)
-    kick_with_noise = kick_with_envelope + noise * noise_envelope
+    noise = 0.5 * white_noise(kick_with_envelope.size, seed, "normal")
+    noise = apply_envelope(noise, decay(0.05, num_samples, sample_rate))
+    kick_with_noise = kick_with_envelope + noise
 
     return kick_with_noise
 
@@ -71,7 +68,7 @@ for note in range(num_sixteenth_notes):
 
     if kick_pattern[note % len(kick_pattern)] == 1:
         sound_waveform[start_idx:end_idx] += \
-            create_kick_sound(100.0, 1.0, sampling_frequency)
+            create_kick_sound(100.0, 0.1, sampling_frequency)
         # generate_sine_wave(100.0, 0.1)
     if snare_pattern[note % len(snare_pattern)] == 1:
         sound_waveform[start_idx:end_idx] += generate_sine_wave(200.0, 0.1)
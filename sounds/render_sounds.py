@@ -0,0 +1,51 @@
+import os
+import sys
+
+# Offline renders of the patches in create_sounds.py, no pyo Server or sound card needed
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Dub"))
+from envelope import adsr, apply_envelope
+from fm import PLUCKED_STRING, SINE_WITH_ENVELOPE, render
+from noise import pink_noise
+from oscillators import to_pcm
+from stream import write_wav
+
+sample_rate = 44100
+output_folder = os.path.join(os.path.expanduser("~"), "Downloads")
+
+# Sound 1: Sine Wave with Envelope
+def create_sine_with_envelope():
+    freq = 440  # Frequency in Hz
+    dur = 2     # Duration in seconds
+
+    return render(SINE_WITH_ENVELOPE, freq, int(dur * sample_rate), sample_rate)
+
+# Sound 2: Plucked String-like Sound
+def create_plucked_string():
+    freq2 = 220  # Frequency in Hz
+    dur2 = 3     # Duration in seconds
+
+    return render(PLUCKED_STRING, freq2, int(dur2 * sample_rate), sample_rate)
+
+# Sound 3: Noise Burst with Envelope
+def create_noise_burst_with_envelope():
+    dur3 = 5     # Duration in seconds
+    num_samples = int(dur3 * sample_rate)
+
+    env3 = adsr(0.5, 0.5, 0.5, 0.5, num_samples, sample_rate)
+    return apply_envelope(pink_noise(num_samples), env3)
+
+# Render each sound to a WAV file
+def main():
+    sounds = {
+        "sine_with_envelope": create_sine_with_envelope(),
+        "plucked_string": create_plucked_string(),
+        "noise_burst": create_noise_burst_with_envelope(),
+    }
+
+    for name, samples in sounds.items():
+        path = os.path.join(output_folder, name + ".wav")
+        write_wav(path, [to_pcm(samples)], sample_rate)
+        print("Wrote", path)
+
+if __name__ == "__main__":
+    main()